@@ -0,0 +1,126 @@
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, event, insert, tuple_, update
+from sqlalchemy.orm import contains_eager
+
+from models import db, Product, Location, StockBalance, ReorderThreshold, StockAlert
+
+# Reorder point for pairs without their own threshold when the app sets none
+DEFAULT_REORDER_POINT = 10
+# Largest number of (product, location) pairs looked up in one IN clause
+EVALUATE_BATCH_SIZE = 500
+
+def default_reorder_point():
+    return current_app.config.get('DEFAULT_REORDER_POINT', DEFAULT_REORDER_POINT)
+
+def _where_pairs(model, pairs):
+    return tuple_(model.product_key, model.location_key).in_(pairs)
+
+# Open, update or close the alerts of the given (product, location) key pairs from
+# their current balances and thresholds. Costs a few queries per batch of pairs,
+# independent of the size of the ledger. Runs in the caller's transaction.
+def evaluate_alerts(pairs):
+    pairs = list(pairs)
+    default = default_reorder_point()
+    for start in range(0, len(pairs), EVALUATE_BATCH_SIZE):
+        batch = pairs[start:start + EVALUATE_BATCH_SIZE]
+        balances = dict(((p, l), on_hand) for p, l, on_hand in db.session.query(
+            StockBalance.product_key, StockBalance.location_key, StockBalance.on_hand
+        ).filter(_where_pairs(StockBalance, batch)))
+        thresholds = dict(((p, l), point) for p, l, point in db.session.query(
+            ReorderThreshold.product_key, ReorderThreshold.location_key, ReorderThreshold.reorder_point
+        ).filter(_where_pairs(ReorderThreshold, batch)))
+        open_alerts = dict(((p, l), (on_hand, point)) for p, l, on_hand, point in db.session.query(
+            StockAlert.product_key, StockAlert.location_key, StockAlert.on_hand, StockAlert.reorder_point
+        ).filter(_where_pairs(StockAlert, batch)))
+
+        opened = []
+        changed = []
+        closed = []
+        for key in batch:
+            on_hand = balances.get(key)
+            reorder_point = thresholds.get(key, default)
+            # Pairs that never held stock have no balance row and raise no alert
+            low = on_hand is not None and on_hand <= reorder_point
+            if low and key not in open_alerts:
+                opened.append({'product_key': key[0], 'location_key': key[1], 'on_hand': on_hand,
+                               'reorder_point': reorder_point, 'opened_at': datetime.now()})
+            elif low and open_alerts[key] != (on_hand, reorder_point):
+                changed.append({'key_product_key': key[0], 'key_location_key': key[1],
+                                'on_hand': on_hand, 'reorder_point': reorder_point})
+            elif not low and key in open_alerts:
+                closed.append(key)
+
+        if opened:
+            db.session.execute(insert(StockAlert), opened)
+        if changed:
+            # One executemany for every alert whose numbers moved
+            db.session.connection().execute(update(StockAlert).where(
+                StockAlert.product_key == bindparam('key_product_key'),
+                StockAlert.location_key == bindparam('key_location_key'),
+            ).values(on_hand=bindparam('on_hand'), reorder_point=bindparam('reorder_point')), changed)
+        if closed:
+            db.session.execute(delete(StockAlert).where(_where_pairs(StockAlert, closed)))
+
+# Recompute every alert from the balances, e.g. after rebuilding balances or
+# changing DEFAULT_REORDER_POINT. Runs in the caller's transaction.
+def rebuild_alerts():
+    default = default_reorder_point()
+    thresholds = dict(((p, l), point) for p, l, point in db.session.query(
+        ReorderThreshold.product_key, ReorderThreshold.location_key, ReorderThreshold.reorder_point
+    ))
+    alerts = []
+    for product_key, location_key, on_hand in db.session.query(
+            StockBalance.product_key, StockBalance.location_key, StockBalance.on_hand):
+        reorder_point = thresholds.get((product_key, location_key), default)
+        if on_hand <= reorder_point:
+            alerts.append({'product_key': product_key, 'location_key': location_key, 'on_hand': on_hand,
+                           'reorder_point': reorder_point, 'opened_at': datetime.now()})
+
+    db.session.execute(delete(StockAlert))
+    if alerts:
+        db.session.execute(insert(StockAlert), alerts)
+    return len(alerts)
+
+# Set (or with None, clear) the reorder point of one pair, by surrogate keys, and
+# re-evaluate its alert.
+# Runs in the caller's transaction.
+def set_reorder_point(product_key, location_key, reorder_point):
+    threshold = db.session.get(ReorderThreshold, (product_key, location_key))
+    if reorder_point is None:
+        if threshold is not None:
+            db.session.delete(threshold)
+    elif threshold is None:
+        db.session.add(ReorderThreshold(product_key=product_key, location_key=location_key, reorder_point=reorder_point))
+    else:
+        threshold.reorder_point = reorder_point
+    db.session.flush()
+    evaluate_alerts([(product_key, location_key)])
+
+def open_alerts(limit=None):
+    query = StockAlert.query.join(StockAlert.product).join(StockAlert.location).options(
+        contains_eager(StockAlert.product), contains_eager(StockAlert.location)
+    ).order_by(
+        (StockAlert.on_hand - StockAlert.reorder_point), Product.product_id, Location.location_id
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def alert_to_dict(alert):
+    return {
+        'product_id': alert.product.product_id,
+        'location_id': alert.location.location_id,
+        'on_hand': alert.on_hand,
+        'reorder_point': alert.reorder_point,
+        'opened_at': alert.opened_at.isoformat(),
+    }
+
+# Every commit first brings the alerts of the balances it touched up to date,
+# so all write paths (forms, API, importer) keep the open-alerts table current
+@event.listens_for(db.session, 'before_commit')
+def evaluate_touched_alerts(session):
+    touched = session.info.get('balance_deltas')
+    if touched:
+        evaluate_alerts(list(touched))
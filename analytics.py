@@ -0,0 +1,129 @@
+from datetime import date, timedelta
+
+from sqlalchemy import func, tuple_
+
+from models import db, DailyMovementRollup, StockBalance
+from reference_data import reference_data
+from movement_listing import parse_movement_filters
+
+# Range shown when no dates are given, ending today
+DEFAULT_RANGE_DAYS = 30
+# Longest range served; the daily series has one point per day
+MAX_RANGE_DAYS = 366
+TOP_MOVERS_LIMIT = 10
+MAX_TOP_MOVERS_LIMIT = 100
+
+# Read the analytics range and filters from request args. Uses the movement
+# filters' parsing, so the same product_id, location_id, date_from and date_to
+# arguments work on both pages. Ranges longer than MAX_RANGE_DAYS are cut to the
+# days ending at date_to. Returns (params, errors).
+def parse_analytics_params(args):
+    filters, errors = parse_movement_filters(args)
+    date_to = filters['date_to'].date() if filters['date_to'] else date.today()
+    date_from = filters['date_from'].date() if filters['date_from'] else date_to - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if date_from > date_to:
+        errors.append('The start date must not be after the end date.')
+        date_from = date_to
+    elif (date_to - date_from).days >= MAX_RANGE_DAYS:
+        errors.append(f'The date range can cover at most {MAX_RANGE_DAYS} days.')
+        date_from = date_to - timedelta(days=MAX_RANGE_DAYS - 1)
+    try:
+        limit = max(1, min(MAX_TOP_MOVERS_LIMIT, int(args.get('limit', TOP_MOVERS_LIMIT))))
+    except ValueError:
+        limit = TOP_MOVERS_LIMIT
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'product_id': filters['product_id'],
+        'location_id': filters['location_id'],
+        'limit': limit,
+    }, errors
+
+# Rollups in the range, restricted to the product and location filters. Unknown ids
+# resolve to no key, which matches no rollups.
+def _rollups(params, catalogs, *columns):
+    query = db.session.query(*columns).filter(
+        DailyMovementRollup.day >= params['date_from'], DailyMovementRollup.day <= params['date_to'])
+    if params['product_id']:
+        query = query.filter(DailyMovementRollup.product_key == catalogs['products'].key_by_id.get(params['product_id']))
+    if params['location_id']:
+        query = query.filter(DailyMovementRollup.location_key == catalogs['locations'].key_by_id.get(params['location_id']))
+    return query
+
+# Throughput, top movers, and velocity with days of cover over a date range, all
+# aggregated in SQL from the daily rollups (at most one row per product, location
+# and active day) instead of the movement ledger.
+def movement_analytics(params):
+    days = (params['date_to'] - params['date_from']).days + 1
+    catalogs = reference_data.catalogs()
+    qty_in = func.coalesce(func.sum(DailyMovementRollup.qty_in), 0)
+    qty_out = func.coalesce(func.sum(DailyMovementRollup.qty_out), 0)
+    movements = func.coalesce(func.sum(DailyMovementRollup.movement_count), 0)
+
+    # Daily series, with quiet days filled in so charts keep a continuous axis
+    by_day = {
+        day: (day_in, day_out, day_movements)
+        for day, day_in, day_out, day_movements in _rollups(
+            params, catalogs, DailyMovementRollup.day, qty_in, qty_out, movements
+        ).group_by(DailyMovementRollup.day)
+    }
+    series = []
+    for offset in range(days):
+        day = params['date_from'] + timedelta(days=offset)
+        day_in, day_out, day_movements = by_day.get(day, (0, 0, 0))
+        series.append({'day': day.isoformat(), 'qty_in': day_in, 'qty_out': day_out, 'movements': day_movements})
+
+    product_ids = catalogs['products'].id_by_key
+    location_ids = catalogs['locations'].id_by_key
+
+    top_movers = [
+        {'product_id': product_ids.get(product_key), 'qty_out': product_out, 'qty_in': product_in,
+         'movements': product_movements}
+        for product_key, product_out, product_in, product_movements in _rollups(
+            params, catalogs, DailyMovementRollup.product_key, qty_out, qty_in, movements
+        ).group_by(DailyMovementRollup.product_key).order_by(qty_out.desc(), DailyMovementRollup.product_key)
+        .limit(params['limit'])
+    ]
+
+    # Velocity is the average units leaving a location per day over the range;
+    # days of cover is how long its current stock lasts at that rate
+    fastest = _rollups(
+        params, catalogs, DailyMovementRollup.product_key, DailyMovementRollup.location_key, qty_out
+    ).group_by(DailyMovementRollup.product_key, DailyMovementRollup.location_key).having(qty_out > 0).order_by(
+        qty_out.desc(), DailyMovementRollup.product_key, DailyMovementRollup.location_key
+    ).limit(params['limit']).all()
+    on_hand = {}
+    if fastest:
+        on_hand = {
+            (product_key, location_key): qty
+            for product_key, location_key, qty in db.session.query(
+                StockBalance.product_key, StockBalance.location_key, StockBalance.on_hand
+            ).filter(tuple_(StockBalance.product_key, StockBalance.location_key).in_(
+                [(product_key, location_key) for product_key, location_key, _ in fastest]))
+        }
+    velocity = []
+    for product_key, location_key, pair_out in fastest:
+        per_day = pair_out / days
+        stock = on_hand.get((product_key, location_key), 0)
+        velocity.append({
+            'product_id': product_ids.get(product_key),
+            'location_id': location_ids.get(location_key),
+            'qty_out': pair_out,
+            'per_day': round(per_day, 2),
+            'on_hand': stock,
+            'days_of_cover': round(max(0, stock) / per_day, 1),
+        })
+
+    return {
+        'date_from': params['date_from'].isoformat(),
+        'date_to': params['date_to'].isoformat(),
+        'days': days,
+        'totals': {
+            'qty_in': sum(point['qty_in'] for point in series),
+            'qty_out': sum(point['qty_out'] for point in series),
+            'movements': sum(point['movements'] for point in series),
+        },
+        'series': series,
+        'top_movers': top_movers,
+        'velocity': velocity,
+    }
@@ -0,0 +1,326 @@
+import base64
+import gzip
+import json
+from datetime import datetime
+from functools import wraps
+
+from flask import Blueprint, jsonify, request, make_response, current_app
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload
+
+from models import db, Product, Location, ProductMovement, StockBalance, TransferDocument
+from dashboard import dashboard_snapshot
+from movement_listing import parse_movement_filters, paginate_movements
+from stock import validate_movement, apply_movement, InsufficientStock
+from versioning import bump_data_version, current_data_version
+from events import record_movement_event
+from transfers import validate_transfer, create_transfer, transfer_to_dict, MAX_REFERENCE_LENGTH
+from reference_data import reference_data
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_BULK_IDS = 1000
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 500
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+@api_v1.errorhandler(ApiError)
+def handle_api_error(error):
+    return jsonify({'error': error.message}), error.status
+
+@api_v1.errorhandler(404)
+def handle_not_found(error):
+    return jsonify({'error': 'Not found'}), 404
+
+# Gzip JSON bodies for clients that accept it
+@api_v1.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+        return response
+    data = response.get_data()
+    if len(data) < GZIP_MIN_SIZE:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=5))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Serve 304 Not Modified when the client's ETag matches the current data version,
+# without running the view's queries at all
+def conditional(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        etag = f'v{current_data_version()}'
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+        response.set_etag(etag, weak=True)
+        return response
+    return wrapper
+
+def _encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        raise ApiError('Invalid cursor')
+
+def _limit():
+    try:
+        return max(1, min(MAX_LIMIT, int(request.args.get('limit', DEFAULT_LIMIT))))
+    except ValueError:
+        raise ApiError('limit must be an integer')
+
+# Comma-separated ids from ?ids=A,B,C, resolved by the caller in one IN query
+def _ids():
+    raw = request.args.get('ids')
+    if raw is None:
+        return None
+    ids = [value.strip() for value in raw.split(',') if value.strip()]
+    if len(ids) > MAX_BULK_IDS:
+        raise ApiError(f'At most {MAX_BULK_IDS} ids per request')
+    return ids
+
+# A string field of a JSON body, or None when it is missing, null or empty
+def _string_field(payload, name):
+    value = payload.get(name)
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise ApiError(f'{name} must be a string')
+    return value
+
+# JSON integers only: int() would also take true as 1 and 2.9 as 2
+def _is_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# Restrict each item to ?fields=a,b when given
+def _select_fields(items, allowed):
+    raw = request.args.get('fields')
+    if not raw:
+        return items
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(f'Unknown fields: {", ".join(unknown)}')
+    return [{field: item[field] for field in fields} for item in items]
+
+def _page(items, allowed, next_cursor):
+    return jsonify({'data': _select_fields(items, allowed), 'next_cursor': next_cursor})
+
+PRODUCT_FIELDS = ('product_id', 'product_name')
+LOCATION_FIELDS = ('location_id',)
+MOVEMENT_FIELDS = ('movement_id', 'timestamp', 'product_id', 'from_location', 'to_location', 'qty')
+BALANCE_FIELDS = ('product_id', 'location_id', 'on_hand')
+
+def product_to_dict(product):
+    return {'product_id': product.product_id, 'product_name': product.product_name}
+
+def location_to_dict(location):
+    return {'location_id': location.location_id}
+
+def movement_to_dict(movement):
+    return {
+        'movement_id': movement.movement_id,
+        'timestamp': movement.timestamp.isoformat(),
+        'product_id': movement.product.product_id,
+        'from_location': movement.source.location_id if movement.source else None,
+        'to_location': movement.destination.location_id if movement.destination else None,
+        'qty': movement.qty,
+    }
+
+def balance_to_dict(balance):
+    return {'product_id': balance.product.product_id, 'location_id': balance.location.location_id,
+            'on_hand': balance.on_hand}
+
+# Keyset page over a unique string id column, or a bulk lookup by ids
+def _list_by_key(model, key_column, to_dict, allowed):
+    ids = _ids()
+    if ids is not None:
+        items = model.query.filter(key_column.in_(ids)).order_by(key_column).all()
+        return _page([to_dict(item) for item in items], allowed, None)
+
+    limit = _limit()
+    query = model.query
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = _decode_cursor(cursor)
+        if not isinstance(position, str):
+            raise ApiError('Invalid cursor')
+        query = query.filter(key_column > position)
+    items = query.order_by(key_column).limit(limit + 1).all()
+    next_cursor = _encode_cursor(getattr(items[limit - 1], key_column.key)) if len(items) > limit else None
+    return _page([to_dict(item) for item in items[:limit]], allowed, next_cursor)
+
+@api_v1.route('/products')
+@conditional
+def list_products():
+    return _list_by_key(Product, Product.product_id, product_to_dict, PRODUCT_FIELDS)
+
+@api_v1.route('/products/<product_id>')
+@conditional
+def get_product(product_id):
+    return jsonify(product_to_dict(Product.query.filter_by(product_id=product_id).first_or_404()))
+
+@api_v1.route('/locations')
+@conditional
+def list_locations():
+    return _list_by_key(Location, Location.location_id, location_to_dict, LOCATION_FIELDS)
+
+@api_v1.route('/locations/<location_id>')
+@conditional
+def get_location(location_id):
+    return jsonify(location_to_dict(Location.query.filter_by(location_id=location_id).first_or_404()))
+
+@api_v1.route('/movements')
+@conditional
+def list_movements():
+    filters, errors = parse_movement_filters(request.args)
+    if errors:
+        raise ApiError(' '.join(errors))
+    movements, next_cursor = paginate_movements(filters, cursor=request.args.get('cursor'), per_page=_limit())
+    return _page([movement_to_dict(movement) for movement in movements], MOVEMENT_FIELDS, next_cursor)
+
+@api_v1.route('/movements/<int:movement_id>')
+@conditional
+def get_movement(movement_id):
+    return jsonify(movement_to_dict(ProductMovement.query.get_or_404(movement_id)))
+
+@api_v1.route('/movements', methods=['POST'])
+def create_movement():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise ApiError('Expected a JSON object')
+
+    product_id = _string_field(payload, 'product_id')
+    from_location = _string_field(payload, 'from_location')
+    to_location = _string_field(payload, 'to_location')
+    qty = payload.get('qty')
+    if not _is_integer(qty):
+        raise ApiError('qty must be an integer')
+
+    catalogs = reference_data.catalogs()
+    product_key = catalogs['products'].key_by_id.get(product_id)
+    if not product_id or product_key is None:
+        raise ApiError(f'Unknown product "{product_id}"')
+    for location_id in (from_location, to_location):
+        if location_id and location_id not in catalogs['locations'].key_by_id:
+            raise ApiError(f'Unknown location "{location_id}"')
+    from_location_key = catalogs['locations'].key_by_id.get(from_location)
+    to_location_key = catalogs['locations'].key_by_id.get(to_location)
+
+    error = validate_movement(product_key, from_location_key, to_location_key, qty)
+    if error:
+        # Past the basic field checks, the only failure is insufficient stock
+        status = 400 if qty <= 0 or not (from_location or to_location) else 409
+        raise ApiError(error, status=status)
+
+    movement = ProductMovement(
+        product_key=product_key,
+        from_location_key=from_location_key,
+        to_location_key=to_location_key,
+        qty=qty,
+        timestamp=datetime.now()
+    )
+    db.session.add(movement)
+    try:
+        apply_movement(movement, reserve=True)
+    except InsufficientStock as e:
+        db.session.rollback()
+        raise ApiError(str(e), status=409)
+    record_movement_event('created', movement)
+    bump_data_version()
+    db.session.commit()
+    dashboard_snapshot.invalidate()
+
+    return jsonify(movement_to_dict(movement)), 201
+
+# Create a multi-line transfer document:
+# {"from_location", "to_location", "reference", "lines": [{"product_id", "qty"}, ...]}.
+# Either every line is booked or none is.
+@api_v1.route('/transfers', methods=['POST'])
+def create_transfer_document():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise ApiError('Expected a JSON object')
+    lines = payload.get('lines')
+    if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+        raise ApiError('lines must be a list of objects')
+    for number, line in enumerate(lines, start=1):
+        if not _is_integer(line.get('qty')):
+            raise ApiError(f'Line {number}: qty must be an integer')
+
+    reference = (_string_field(payload, 'reference') or '').strip()
+    if len(reference) > MAX_REFERENCE_LENGTH:
+        raise ApiError(f'reference can be at most {MAX_REFERENCE_LENGTH} characters')
+
+    from_location = _string_field(payload, 'from_location')
+    to_location = _string_field(payload, 'to_location')
+    lines, errors = validate_transfer(from_location, to_location,
+                                      [(line.get('product_id'), line.get('qty')) for line in lines])
+    if errors:
+        # Insufficient stock is only checked once everything else is valid
+        status = 409 if all(error.startswith('Insufficient stock') for error in errors) else 400
+        return jsonify({'error': errors[0], 'errors': errors}), status
+
+    try:
+        document = create_transfer(from_location, to_location, lines, reference)
+    except InsufficientStock as e:
+        db.session.rollback()
+        raise ApiError(str(e), status=409)
+    bump_data_version()
+    db.session.commit()
+    dashboard_snapshot.invalidate()
+
+    return jsonify(transfer_to_dict(document)), 201
+
+@api_v1.route('/transfers/<int:document_id>')
+@conditional
+def get_transfer(document_id):
+    return jsonify(transfer_to_dict(TransferDocument.query.get_or_404(document_id)))
+
+@api_v1.route('/balances')
+@conditional
+def list_balances():
+    catalogs = reference_data.catalogs()
+    product_keys = catalogs['products'].key_by_id
+    location_keys = catalogs['locations'].key_by_id
+
+    # Ids are resolved to surrogate keys in memory; unknown ids match nothing
+    query = StockBalance.query.options(joinedload(StockBalance.product), joinedload(StockBalance.location))
+    if request.args.get('product_id'):
+        query = query.filter(StockBalance.product_key == product_keys.get(request.args['product_id']))
+    if request.args.get('location_id'):
+        query = query.filter(StockBalance.location_key == location_keys.get(request.args['location_id']))
+
+    ids = _ids()
+    if ids is not None:
+        # Bulk lookup by product ids
+        query = query.filter(StockBalance.product_key.in_([product_keys[id_] for id_ in ids if id_ in product_keys]))
+
+    limit = _limit()
+    cursor = request.args.get('cursor')
+    if cursor:
+        position = _decode_cursor(cursor)
+        if not isinstance(position, list) or len(position) != 2:
+            raise ApiError('Invalid cursor')
+        query = query.filter(tuple_(StockBalance.product_key, StockBalance.location_key) > tuple(position))
+
+    balances = query.order_by(StockBalance.product_key, StockBalance.location_key).limit(limit + 1).all()
+    next_cursor = None
+    if len(balances) > limit:
+        last = balances[limit - 1]
+        next_cursor = _encode_cursor([last.product_key, last.location_key])
+    return _page([balance_to_dict(balance) for balance in balances[:limit]], BALANCE_FIELDS, next_cursor)
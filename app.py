@@ -1,37 +1,78 @@
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context, send_file, abort
 from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
 from sqlalchemy import func
-from datetime import datetime
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+from datetime import date, datetime
+import click
+from flask.cli import AppGroup
+import json
 import os
+import queue
+
+from config import Config, configure_engine
 
 # Import models and db
-from models import db, Product, Location, ProductMovement
+from models import db, Product, Location, ProductMovement, StockBalance, ReorderThreshold, StockAlert, Job, TransferDocument, DailyMovementRollup
+from stock import validate_movement, apply_movement, revert_movement, rebuild_stock_balances, InsufficientStock
+from transfers import validate_transfer, create_transfer, MAX_TRANSFER_LINES, MAX_REFERENCE_LENGTH
+from reporting import build_balance_report
+from checkpoints import totals_as_of, create_checkpoint, prune_checkpoints, invalidate_checkpoints
+from dashboard import dashboard_snapshot
+from jobs import submit_job, result_path, job_to_dict, run_worker
+from http_cache import page_cache
+from assets import asset_manifest, build_assets
+from reference_data import reference_data, LOOKUP_KINDS, LOOKUP_PAGE_SIZE
+from events import event_broker, record_movement_event, events_since, format_sse
+from alerts import open_alerts, alert_to_dict, rebuild_alerts, set_reorder_point
+from analytics import parse_analytics_params, movement_analytics
+from rollups import rebuild_rollups
+from schema import upgrade_schema, MIGRATIONS_DIR
+from versioning import bump_data_version
+from importer import detect_format, iter_records, import_movements, DEFAULT_CHUNK_SIZE, FORMATS
+from api import api_v1
+from search import search_products
+from instrumentation import instrumentation
+from exports import iter_csv, iter_movement_rows, iter_report_rows, MOVEMENT_COLUMNS, REPORT_COLUMNS
+from movement_listing import parse_movement_filters, parse_page_size, paginate_movements, DIRECTIONS
+
+# Most results shown on the search page
+SEARCH_PAGE_LIMIT = 100
 
 # Initialize Flask app
 app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'inventory_management_secret_key')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///inventory.db')
-if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgres://'):
-    app.config['SQLALCHEMY_DATABASE_URI'] = app.config['SQLALCHEMY_DATABASE_URI'].replace('postgres://', 'postgresql://', 1)
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config.from_object(Config)
 
 # Initialize the db with the app
 db.init_app(app)
+migrate = Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
+
+# Versioned JSON API
+app.register_blueprint(api_v1)
+
+# In-process cache of dashboard metrics, invalidated by every write route
+dashboard_snapshot.ttl = app.config['DASHBOARD_CACHE_TTL']
+
+# Rendered read-only pages, cached per data version
+page_cache.init_app(app)
+
+# Fingerprinted static assets (`flask assets build`) with long-lived cache headers
+asset_manifest.init_app(app)
+
+# Result files of background jobs
+if not app.config['JOB_RESULTS_DIR']:
+    app.config['JOB_RESULTS_DIR'] = os.path.join(app.instance_path, 'jobs')
+
+# Live feed of committed changes, shared across workers through the event log
+event_broker.init_app(app)
 
-# Create database tables
 with app.app_context():
-    db.create_all()
-    # Safe migration: ensure product_name column exists (for SQLite)
-    try:
-        conn = db.engine.connect()
-        try:
-            cols = [row[1] for row in conn.exec_driver_sql('PRAGMA table_info(product)').fetchall()]
-            if 'product_name' not in cols:
-                conn.exec_driver_sql('ALTER TABLE product ADD COLUMN product_name VARCHAR(100)')
-        finally:
-            conn.close()
-    except Exception:
-        pass
+    configure_engine(db.engine)
+    if app.config['INSTRUMENTATION']:
+        instrumentation.init_app(app, db.engine)
+    # Schema migrations run here only when enabled; otherwise via `flask upgrade-db`
+    if app.config['AUTO_MIGRATE']:
+        upgrade_schema()
 
 # Route for Index (Welcome Page)
 @app.route('/')
@@ -40,69 +81,81 @@ def index():
 
 # Routes for Dashboard
 @app.route('/dashboard')
+@page_cache.cached
 def dashboard():
-    # Count statistics
-    product_count = Product.query.count()
-    location_count = Location.query.count()
-    movement_count = ProductMovement.query.count()
-    
-    # Get low stock items (less than 10 items)
-    low_stock_query = db.session.query(
-        Product.product_id,
-        func.sum(ProductMovement.qty).label('total_qty')
-    ).join(ProductMovement).group_by(Product.product_id).having(func.sum(ProductMovement.qty) < 10)
-    
-    low_stock_count = low_stock_query.count()
-    
-    # Get recent movements
-    recent_movements = ProductMovement.query.order_by(ProductMovement.movement_id.desc()).limit(5).all()
-    
-    # Prepare data for charts
-    products = Product.query.all()
-    product_names = [product.product_id for product in products]
-    
-    # Get stock levels for each product
-    stock_levels = []
-    for product in products:
-        total_qty = db.session.query(func.sum(ProductMovement.qty)).filter(
-            ProductMovement.product_id == product.product_id
-        ).scalar() or 0
-        stock_levels.append(total_qty)
-    
-    return render_template('dashboard.html', 
-                          product_count=product_count,
-                          location_count=location_count,
-                          movement_count=movement_count,
-                          low_stock_count=low_stock_count,
-                          recent_movements=recent_movements,
-                          product_labels=product_names,
-                          stock_data=stock_levels,
-                          stock_levels=stock_levels)
-
-
+    snapshot = dashboard_snapshot.get()
+    return render_template('dashboard.html', **snapshot)
+
+@app.route('/api/dashboard')
+def api_dashboard():
+    return jsonify(dashboard_snapshot.get())
+
+# One page of catalog rows in id order, seeking past the id `after`.
+# Returns (rows, next_after); next_after is None on the last page.
+def paginate_by_id(query, id_column, after, per_page):
+    if after:
+        query = query.filter(id_column > after)
+    rows = query.order_by(id_column).limit(per_page + 1).all()
+    if len(rows) > per_page:
+        return rows[:per_page], rows[per_page - 1][0]
+    return rows, None
 
 # Routes for Products
 @app.route('/products')
+@page_cache.cached
 def products():
+    per_page = parse_page_size(request.args.get('per_page'))
+    after = request.args.get('after')
     try:
-        products = Product.query.all()
+        products, next_after = paginate_by_id(db.session.query(Product.product_id, Product.product_name),
+                                              Product.product_id, after, per_page)
     except Exception as e:
         db.session.rollback()
         flash(f'Error loading products: {e}', 'danger')
-        products = []
-    return render_template('products.html', products=products)
+        products, next_after = [], None
+    return render_template('products.html', products=products, next_after=next_after, is_first_page=not after)
 
 # Search route
 @app.route('/search')
 def search():
-    query = request.args.get('query', '')
+    query = request.args.get('query', '').strip()
     if not query:
         return redirect(url_for('products'))
     
-    # Search in products
-    products = Product.query.filter(Product.product_id.like(f'%{query}%')).all()
+    # Ranked search over product IDs and names, capped to one page of results
+    products = search_products(query, limit=SEARCH_PAGE_LIMIT)
     
-    return render_template('products.html', products=products, search_query=query)
+    return render_template('products.html', products=products, search_query=query,
+                           search_limited=len(products) >= SEARCH_PAGE_LIMIT)
+
+# Typeahead suggestions for the search box
+@app.route('/api/search/suggest')
+def search_suggest():
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        limit = 10
+    response = jsonify(search_products(request.args.get('q', ''), limit=limit))
+    # Let the browser reuse suggestions briefly while the user keeps typing
+    response.cache_control.max_age = 30
+    response.cache_control.private = True
+    return response
+
+# Paged product/location lookups for the form widgets: ?q= filters by id or name,
+# ?after= continues from the last id of the previous page
+@app.route('/api/lookup/<kind>')
+def lookup(kind):
+    if kind not in LOOKUP_KINDS:
+        abort(404)
+    try:
+        limit = int(request.args.get('limit', LOOKUP_PAGE_SIZE))
+    except ValueError:
+        limit = LOOKUP_PAGE_SIZE
+    items, next_after = reference_data.lookup(kind, request.args.get('q', ''), request.args.get('after'), limit)
+    response = jsonify({'items': [{'id': id_, 'label': label} for id_, label in items], 'next_after': next_after})
+    response.cache_control.max_age = 30
+    response.cache_control.private = True
+    return response
 
 @app.route('/products/add', methods=['GET', 'POST'])
 def add_product():
@@ -119,7 +172,9 @@ def add_product():
         # Create new product
         new_product = Product(product_id=product_id, product_name=product_name)
         db.session.add(new_product)
+        bump_data_version(catalog=True)
         db.session.commit()
+        dashboard_snapshot.invalidate()
         
         flash('Product added successfully!', 'success')
         return redirect(url_for('products'))
@@ -128,7 +183,7 @@ def add_product():
 
 @app.route('/products/edit/<product_id>', methods=['GET', 'POST'])
 def edit_product(product_id):
-    product = Product.query.get_or_404(product_id)
+    product = Product.query.filter_by(product_id=product_id).first_or_404()
     
     if request.method == 'POST':
         new_product_id = request.form['product_id']
@@ -141,10 +196,13 @@ def edit_product(product_id):
                 flash('Product ID already exists!', 'danger')
                 return redirect(url_for('edit_product', product_id=product_id))
         
-        # Update product
+        # Update product; movements and balances reference its surrogate key,
+        # so a new product_id only rewrites this row
         product.product_id = new_product_id
         product.product_name = new_product_name
+        bump_data_version(catalog=True)
         db.session.commit()
+        dashboard_snapshot.invalidate()
         
         flash('Product updated successfully!', 'success')
         return redirect(url_for('products'))
@@ -153,25 +211,37 @@ def edit_product(product_id):
 
 @app.route('/products/delete/<product_id>', methods=['POST'])
 def delete_product(product_id):
-    product = Product.query.get_or_404(product_id)
+    product = Product.query.filter_by(product_id=product_id).first_or_404()
     
     # Check if product is used in any movements
-    movements = ProductMovement.query.filter_by(product_id=product_id).first()
+    movements = ProductMovement.query.filter_by(product_key=product.id).first()
     if movements:
         flash('Cannot delete product as it is used in product movements!', 'danger')
         return redirect(url_for('products'))
     
+    # Drop the zero balances (and their alerts, thresholds and rollups) left behind
+    # by its deleted movements so the foreign keys hold
+    StockBalance.query.filter_by(product_key=product.id).delete()
+    DailyMovementRollup.query.filter_by(product_key=product.id).delete()
+    StockAlert.query.filter_by(product_key=product.id).delete()
+    ReorderThreshold.query.filter_by(product_key=product.id).delete()
     db.session.delete(product)
+    bump_data_version(catalog=True)
     db.session.commit()
+    dashboard_snapshot.invalidate()
     
     flash('Product deleted successfully!', 'success')
     return redirect(url_for('products'))
 
 # Routes for Locations
 @app.route('/locations')
+@page_cache.cached
 def locations():
-    locations = Location.query.all()
-    return render_template('locations.html', locations=locations)
+    per_page = parse_page_size(request.args.get('per_page'))
+    after = request.args.get('after')
+    locations, next_after = paginate_by_id(db.session.query(Location.location_id), Location.location_id,
+                                           after, per_page)
+    return render_template('locations.html', locations=locations, next_after=next_after, is_first_page=not after)
 
 @app.route('/locations/add', methods=['GET', 'POST'])
 def add_location():
@@ -187,7 +257,9 @@ def add_location():
         # Create new location
         new_location = Location(location_id=location_id)
         db.session.add(new_location)
+        bump_data_version(catalog=True)
         db.session.commit()
+        dashboard_snapshot.invalidate()
         
         flash('Location added successfully!', 'success')
         return redirect(url_for('locations'))
@@ -196,7 +268,7 @@ def add_location():
 
 @app.route('/locations/edit/<location_id>', methods=['GET', 'POST'])
 def edit_location(location_id):
-    location = Location.query.get_or_404(location_id)
+    location = Location.query.filter_by(location_id=location_id).first_or_404()
     
     if request.method == 'POST':
         new_location_id = request.form['location_id']
@@ -208,9 +280,11 @@ def edit_location(location_id):
                 flash('Location ID already exists!', 'danger')
                 return redirect(url_for('edit_location', location_id=location_id))
         
-        # Update location
+        # Update location; like products, only this row changes
         location.location_id = new_location_id
+        bump_data_version(catalog=True)
         db.session.commit()
+        dashboard_snapshot.invalidate()
         
         flash('Location updated successfully!', 'success')
         return redirect(url_for('locations'))
@@ -219,98 +293,161 @@ def edit_location(location_id):
 
 @app.route('/locations/delete/<location_id>', methods=['POST'])
 def delete_location(location_id):
-    location = Location.query.get_or_404(location_id)
+    location = Location.query.filter_by(location_id=location_id).first_or_404()
     
     # Check if location is used in any movements
-    from_movements = ProductMovement.query.filter_by(from_location=location_id).first()
-    to_movements = ProductMovement.query.filter_by(to_location=location_id).first()
+    from_movements = ProductMovement.query.filter_by(from_location_key=location.id).first()
+    to_movements = ProductMovement.query.filter_by(to_location_key=location.id).first()
     
     if from_movements or to_movements:
         flash('Cannot delete location as it is used in product movements!', 'danger')
         return redirect(url_for('locations'))
+    if TransferDocument.query.filter((TransferDocument.from_location_key == location.id) |
+                                     (TransferDocument.to_location_key == location.id)).first():
+        flash('Cannot delete location as it is used in transfer documents!', 'danger')
+        return redirect(url_for('locations'))
     
+    # Drop the zero balances (and their alerts, thresholds and rollups) left behind
+    # by its deleted movements so the foreign keys hold
+    StockBalance.query.filter_by(location_key=location.id).delete()
+    DailyMovementRollup.query.filter_by(location_key=location.id).delete()
+    StockAlert.query.filter_by(location_key=location.id).delete()
+    ReorderThreshold.query.filter_by(location_key=location.id).delete()
     db.session.delete(location)
+    bump_data_version(catalog=True)
     db.session.commit()
+    dashboard_snapshot.invalidate()
     
     flash('Location deleted successfully!', 'success')
     return redirect(url_for('locations'))
 
 # Routes for Product Movements
 @app.route('/movements')
+@page_cache.cached
 def movements():
+    filters, errors = parse_movement_filters(request.args)
+    for error in errors:
+        flash(error, 'warning')
+    per_page = parse_page_size(request.args.get('per_page'))
+    cursor = request.args.get('cursor')
+
     try:
-        movements = ProductMovement.query.order_by(ProductMovement.timestamp.desc()).all()
+        movements, next_cursor = paginate_movements(filters, cursor=cursor, per_page=per_page)
     except Exception as e:
         db.session.rollback()
         flash(f'Error loading movements: {e}', 'danger')
-        movements = []
-    return render_template('movements.html', movements=movements)
+        movements, next_cursor = [], None
+
+    # Keep the active filters on pagination links
+    filter_args = {key: value for key, value in request.args.items() if key not in ('cursor',) and value}
+    return render_template('movements.html', movements=movements, next_cursor=next_cursor,
+                           is_first_page=not cursor, filter_args=filter_args, directions=DIRECTIONS)
+
+# Stream a CSV download; the generator keeps the request context (and its
+# database session) alive until the last row is sent
+def csv_download(filename, rows):
+    response = Response(stream_with_context(rows), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+# Export the filtered movement history as CSV, streamed in batches
+@app.route('/movements.csv')
+def export_movements_csv():
+    filters, errors = parse_movement_filters(request.args)
+    if errors:
+        return Response(' '.join(errors), status=400, mimetype='text/plain')
+    return csv_download('movements.csv', iter_csv(MOVEMENT_COLUMNS, iter_movement_rows(filters)))
+
+@app.route('/movements/import', methods=['GET', 'POST'])
+def import_movements_upload():
+    result = None
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a CSV or JSONL file to import.', 'danger')
+            return render_template('import_movements.html', result=None, max_errors=100)
+
+        fmt = detect_format(upload.filename)
+        if request.form.get('background'):
+            # Large files: save the upload and let `flask worker` import it
+            job = submit_job('import_movements', {'fmt': fmt})
+            path = result_path(job, f'input.{fmt}')
+            upload.save(path)
+            job.params = json.dumps({'path': path, 'fmt': fmt})
+            db.session.commit()
+            flash(f'Import queued as job #{job.id}.', 'info')
+            return redirect(url_for('jobs'))
+
+        records = iter_records(upload.stream, fmt)
+        result = import_movements(records)
+        dashboard_snapshot.invalidate()
+
+        if result['failed']:
+            flash(f"Imported {result['imported']} movements; {result['failed']} rows were rejected.", 'warning')
+        else:
+            flash(f"Imported {result['imported']} movements.", 'success')
+
+    return render_template('import_movements.html', result=result, max_errors=100)
+
+# Render a movement form with cached product/location choices, keeping the
+# submitted values when a POST is rejected
+def movement_form(template, **context):
+    return render_template(template, form=request.form,
+                           product_choices=reference_data.choices('products'),
+                           location_choices=reference_data.choices('locations'), **context)
+
+# Surrogate keys of a movement's product and locations, from the cached catalogs
+def movement_keys(product_id, from_location, to_location):
+    catalogs = reference_data.catalogs()
+    locations = catalogs['locations'].key_by_id
+    return catalogs['products'].key_by_id[product_id], locations.get(from_location), locations.get(to_location)
 
 @app.route('/movements/add', methods=['GET', 'POST'])
 def add_movement():
-    products = Product.query.all()
-    locations = Location.query.all()
-    
     if request.method == 'POST':
         product_id = request.form['product_id']
         from_location = request.form.get('from_location') or None
         to_location = request.form.get('to_location') or None
         qty = int(request.form['qty'])
 
-        # Basic validations
-        if qty <= 0:
-            flash('Quantity must be a positive number!', 'danger')
-            return render_template('add_movement.html', products=products, locations=locations)
-        
-        # Validate that at least one location is specified
-        if not from_location and not to_location:
-            flash('Either source or destination location must be specified!', 'danger')
-            return render_template('add_movement.html', products=products, locations=locations)
-
-        # Prevent negative stock: when moving OUT from a location, ensure sufficient stock
-        if from_location:
-            incoming = db.session.query(db.func.sum(ProductMovement.qty)).filter(
-                ProductMovement.product_id == product_id,
-                ProductMovement.to_location == from_location
-            ).scalar() or 0
-
-            outgoing = db.session.query(db.func.sum(ProductMovement.qty)).filter(
-                ProductMovement.product_id == product_id,
-                ProductMovement.from_location == from_location
-            ).scalar() or 0
-
-            available = incoming - outgoing
-
-            # If no stock available at source, block any outward/transfer movement
-            if available <= 0:
-                flash('No stock available at the source location for this product.', 'danger')
-                return render_template('add_movement.html', products=products, locations=locations)
-            if qty > available:
-                flash(f'Insufficient stock at source location. Available: {available}', 'danger')
-                return render_template('add_movement.html', products=products, locations=locations)
+        error = reference_data.unknown_reference(product_id, from_location, to_location)
+        if not error:
+            product_key, from_location_key, to_location_key = movement_keys(product_id, from_location, to_location)
+            error = validate_movement(product_key, from_location_key, to_location_key, qty)
+        if error:
+            flash(error, 'danger')
+            return movement_form('add_movement.html')
 
         # Create new movement
         new_movement = ProductMovement(
-            product_id=product_id,
-            from_location=from_location,
-            to_location=to_location,
+            product_key=product_key,
+            from_location_key=from_location_key,
+            to_location_key=to_location_key,
             qty=qty,
             timestamp=datetime.now()
         )
         
         db.session.add(new_movement)
+        try:
+            # Conditional decrement at the source guards against concurrent oversell
+            apply_movement(new_movement, reserve=True)
+        except InsufficientStock as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return movement_form('add_movement.html')
+        record_movement_event('created', new_movement)
+        bump_data_version()
         db.session.commit()
+        dashboard_snapshot.invalidate()
         
         flash('Product movement recorded successfully!', 'success')
         return redirect(url_for('movements'))
     
-    return render_template('add_movement.html', products=products, locations=locations)
+    return movement_form('add_movement.html')
 
 @app.route('/movements/edit/<int:movement_id>', methods=['GET', 'POST'])
 def edit_movement(movement_id):
     movement = ProductMovement.query.get_or_404(movement_id)
-    products = Product.query.all()
-    locations = Location.query.all()
     
     if request.method == 'POST':
         new_product_id = request.form['product_id']
@@ -318,120 +455,388 @@ def edit_movement(movement_id):
         new_to_location = request.form.get('to_location') or None
         new_qty = int(request.form['qty'])
 
-        if new_qty <= 0:
-            flash('Quantity must be a positive number!', 'danger')
-            return render_template('edit_movement.html', movement=movement, products=products, locations=locations)
-
-        # Validate that at least one location is specified
-        if not new_from_location and not new_to_location:
-            flash('Either source or destination location must be specified!', 'danger')
-            return render_template('edit_movement.html', movement=movement, products=products, locations=locations)
-
-        # Prevent negative stock at the source after update.
-        if new_from_location:
-            incoming = db.session.query(db.func.sum(ProductMovement.qty)).filter(
-                ProductMovement.product_id == new_product_id,
-                ProductMovement.to_location == new_from_location
-            ).scalar() or 0
-
-            outgoing = db.session.query(db.func.sum(ProductMovement.qty)).filter(
-                ProductMovement.product_id == new_product_id,
-                ProductMovement.from_location == new_from_location
-            ).scalar() or 0
-
-            available = incoming - outgoing
-
-            # If the original movement was also outgoing from the same source, add its qty back for availability check
-            if movement.from_location == new_from_location and movement.product_id == new_product_id:
-                available += movement.qty
-
-            # If no stock available at source, block any outward/transfer movement
-            if available <= 0:
-                flash('No stock available at the source location for this product.', 'danger')
-                return render_template('edit_movement.html', movement=movement, products=products, locations=locations)
-
-            if new_qty > available:
-                flash(f'Insufficient stock at source location. Available: {available}', 'danger')
-                return render_template('edit_movement.html', movement=movement, products=products, locations=locations)
-
-        # Apply updates
-        movement.product_id = new_product_id
-        movement.from_location = new_from_location
-        movement.to_location = new_to_location
+        error = reference_data.unknown_reference(new_product_id, new_from_location, new_to_location)
+        if not error:
+            product_key, from_location_key, to_location_key = movement_keys(
+                new_product_id, new_from_location, new_to_location)
+            error = validate_movement(product_key, from_location_key, to_location_key, new_qty, original=movement)
+        if error:
+            flash(error, 'danger')
+            return movement_form('edit_movement.html', movement=movement)
+
+        # Apply updates, moving the balances from the old booking to the new one
+        invalidate_checkpoints(movement.timestamp)
+        revert_movement(movement)
+        movement.product_key = product_key
+        movement.from_location_key = from_location_key
+        movement.to_location_key = to_location_key
         movement.qty = new_qty
+        try:
+            apply_movement(movement, reserve=True)
+        except InsufficientStock as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return movement_form('edit_movement.html', movement=movement)
         
+        record_movement_event('updated', movement)
+        bump_data_version()
         db.session.commit()
+        dashboard_snapshot.invalidate()
         flash('Product movement updated successfully!', 'success')
         return redirect(url_for('movements'))
     
-    return render_template('edit_movement.html', movement=movement, products=products, locations=locations)
+    return movement_form('edit_movement.html', movement=movement)
 
 @app.route('/movements/delete/<int:movement_id>', methods=['POST'])
 def delete_movement(movement_id):
     movement = ProductMovement.query.get_or_404(movement_id)
+    invalidate_checkpoints(movement.timestamp)
+    revert_movement(movement)
+    record_movement_event('deleted', movement)
     db.session.delete(movement)
+    bump_data_version()
     db.session.commit()
+    dashboard_snapshot.invalidate()
     
     flash('Product movement deleted successfully!', 'success')
     return redirect(url_for('movements'))
 
+# Routes for Transfer Documents
+@app.route('/transfers')
+def transfers():
+    line_counts = db.session.query(ProductMovement.document_id, func.count(ProductMovement.movement_id)).filter(
+        ProductMovement.document_id.isnot(None)).group_by(ProductMovement.document_id).subquery()
+    documents = db.session.query(TransferDocument, line_counts.c[1]).outerjoin(
+        line_counts, line_counts.c.document_id == TransferDocument.id
+    ).options(joinedload(TransferDocument.source), joinedload(TransferDocument.destination)).order_by(TransferDocument.id.desc()).limit(50).all()
+    return render_template('transfers.html', documents=documents)
+
+@app.route('/transfers/add', methods=['GET', 'POST'])
+def add_transfer():
+    if request.method == 'POST':
+        from_location = request.form.get('from_location') or None
+        to_location = request.form.get('to_location') or None
+        # Blank rows of the line editor are ignored
+        raw_lines = [(product_id, qty) for product_id, qty in
+                     zip(request.form.getlist('line_product_id'), request.form.getlist('line_qty'))
+                     if product_id.strip() or qty.strip()]
+
+        reference = request.form.get('reference', '').strip()
+        lines, errors = validate_transfer(from_location, to_location, raw_lines)
+        if len(reference) > MAX_REFERENCE_LENGTH:
+            errors.append(f'Reference can be at most {MAX_REFERENCE_LENGTH} characters.')
+        if errors:
+            for error in errors:
+                flash(error, 'danger')
+            return transfer_form(raw_lines)
+
+        try:
+            document = create_transfer(from_location, to_location, lines, reference)
+        except InsufficientStock as e:
+            db.session.rollback()
+            flash(str(e), 'danger')
+            return transfer_form(raw_lines)
+        bump_data_version()
+        db.session.commit()
+        dashboard_snapshot.invalidate()
+
+        flash(f'Transfer #{document.id} recorded with {len(lines)} lines.', 'success')
+        return redirect(url_for('transfer_detail', document_id=document.id))
+
+    return transfer_form([])
+
+# Render the transfer form, keeping submitted lines (plus room for more) on errors
+def transfer_form(lines):
+    return render_template('add_transfer.html', form=request.form, lines=lines + [('', '')] * max(1, 5 - len(lines)),
+                           max_lines=MAX_TRANSFER_LINES,
+                           product_choices=reference_data.choices('products'),
+                           location_choices=reference_data.choices('locations'))
+
+@app.route('/transfers/<int:document_id>')
+def transfer_detail(document_id):
+    document = TransferDocument.query.options(
+        joinedload(TransferDocument.source), joinedload(TransferDocument.destination),
+        selectinload(TransferDocument.lines).joinedload(ProductMovement.product)
+    ).filter_by(id=document_id).first_or_404()
+    return render_template('transfer_detail.html', document=document)
+
+# Server-sent events: movements and balance changes as they are committed.
+# Clients resume after a disconnect from the Last-Event-ID they last saw.
+@app.route('/events')
+def events_stream():
+    subscription = event_broker.subscribe()
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    backlog = events_since(int(last_event_id)) if last_event_id.isdigit() else []
+
+    def stream():
+        sent = {event_id for event_id, _, _ in backlog}
+        try:
+            yield 'retry: 3000\n\n'
+            for event_id, kind, payload in backlog:
+                yield format_sse(event_id, kind, payload)
+            while not subscription.dropped:
+                try:
+                    event_id, kind, payload = subscription.queue.get(timeout=15)
+                except queue.Empty:
+                    # Keep proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                if event_id not in sent:
+                    yield format_sse(event_id, kind, payload)
+        finally:
+            event_broker.unsubscribe(subscription)
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Background jobs
+@app.route('/jobs')
+def jobs():
+    jobs = Job.query.order_by(Job.id.desc()).limit(50).all()
+    return render_template('jobs.html', jobs=jobs)
+
+@app.route('/jobs/report', methods=['POST'])
+def submit_report_job():
+    try:
+        as_of = parse_as_of(request.form.get('as_of'))
+    except ValueError:
+        flash('Invalid as-of date (expected YYYY-MM-DD).', 'danger')
+        return redirect(url_for('report'))
+    job = submit_job('report_csv', {'as_of': as_of.isoformat() if as_of else None})
+    db.session.commit()
+    flash(f'Report export queued as job #{job.id}.', 'info')
+    return redirect(url_for('jobs'))
+
+@app.route('/jobs/movements', methods=['POST'])
+def submit_movements_job():
+    filters, errors = parse_movement_filters(request.form)
+    if errors:
+        for error in errors:
+            flash(error, 'danger')
+        return redirect(url_for('movements'))
+    job = submit_job('movements_csv', {'filters': {key: value for key, value in request.form.items() if value}})
+    db.session.commit()
+    flash(f'Movement export queued as job #{job.id}.', 'info')
+    return redirect(url_for('jobs'))
+
+@app.route('/jobs/rebuild-balances', methods=['POST'])
+def submit_rebuild_job():
+    job = submit_job('rebuild_balances')
+    db.session.commit()
+    flash(f'Balance rebuild queued as job #{job.id}.', 'info')
+    return redirect(url_for('jobs'))
+
+@app.route('/jobs/<int:job_id>/download')
+def download_job_result(job_id):
+    job = Job.query.get_or_404(job_id)
+    if job.status != 'succeeded' or not job.result_name:
+        abort(404)
+    return send_file(result_path(job, job.result_name), as_attachment=True, download_name=job.result_name)
+
+@app.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    return jsonify(job_to_dict(Job.query.get_or_404(job_id)))
+
+# Low-stock alerts and reorder points
+@app.route('/alerts')
+@page_cache.cached
+def alerts():
+    thresholds = ReorderThreshold.query.join(ReorderThreshold.product).join(ReorderThreshold.location).options(
+        contains_eager(ReorderThreshold.product), contains_eager(ReorderThreshold.location)
+    ).order_by(Product.product_id, Location.location_id).all()
+    return render_template('alerts.html', alerts=open_alerts(), thresholds=thresholds,
+                           product_choices=reference_data.choices('products'),
+                           location_choices=reference_data.choices('locations'),
+                           default_reorder_point=app.config['DEFAULT_REORDER_POINT'])
+
+@app.route('/alerts/thresholds', methods=['POST'])
+def set_threshold():
+    product_id = request.form['product_id']
+    location_id = request.form['location_id']
+    value = request.form.get('reorder_point', '').strip()
+    product_key = reference_data.key('products', product_id)
+    location_key = reference_data.key('locations', location_id)
+    if product_key is None or location_key is None:
+        flash('Unknown product or location.', 'danger')
+        return redirect(url_for('alerts'))
+    try:
+        reorder_point = int(value) if value else None
+    except ValueError:
+        flash('Reorder point must be a whole number.', 'danger')
+        return redirect(url_for('alerts'))
+    if reorder_point is not None and reorder_point < 0:
+        flash('Reorder point cannot be negative.', 'danger')
+        return redirect(url_for('alerts'))
+
+    set_reorder_point(product_key, location_key, reorder_point)
+    bump_data_version()
+    db.session.commit()
+    dashboard_snapshot.invalidate()
+
+    if reorder_point is None:
+        flash(f'Reorder point for {product_id} at {location_id} reset to the default.', 'success')
+    else:
+        flash(f'Reorder point for {product_id} at {location_id} set to {reorder_point}.', 'success')
+    return redirect(url_for('alerts'))
+
+@app.route('/api/alerts')
+def api_alerts():
+    return jsonify([alert_to_dict(alert) for alert in open_alerts()])
+
+# The default range ends today, so cached copies of the page expire at midnight
+def analytics_cache_day():
+    return date.today().isoformat()
+
+# Movement throughput, top movers and days of cover from the daily rollups
+@app.route('/analytics')
+@page_cache.cached(vary=analytics_cache_day)
+def analytics():
+    params, errors = parse_analytics_params(request.args)
+    for error in errors:
+        flash(error, 'warning')
+    return render_template('analytics.html', params=params, analytics=movement_analytics(params),
+                           product_choices=reference_data.choices('products'),
+                           location_choices=reference_data.choices('locations'))
+
+@app.route('/api/analytics')
+def api_analytics():
+    params, errors = parse_analytics_params(request.args)
+    if errors:
+        return jsonify({'error': errors[0]}), 400
+    return jsonify(movement_analytics(params))
+
+# Parse the report's as_of argument; a bare date means the end of that day
+def parse_as_of(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    as_of = datetime.fromisoformat(value)
+    if len(value) == 10:
+        as_of = as_of.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return as_of
+
 # Route for Balance Report
 @app.route('/report')
+@page_cache.cached
 def report():
-    # Get all products and locations
-    products = Product.query.all()
-    locations = Location.query.all()
-    
-    # Initialize the balance report data structure
-    balance_report = []
-    any_zero_balance = False
-    
-    # Calculate balance for each product at each location
-    for product in products:
-        for location in locations:
-            # Calculate incoming quantity (to_location = current location)
-            incoming = db.session.query(db.func.sum(ProductMovement.qty)).filter(
-                ProductMovement.product_id == product.product_id,
-                ProductMovement.to_location == location.location_id
-            ).scalar() or 0
-            
-            # Calculate outgoing quantity (from_location = current location)
-            outgoing = db.session.query(db.func.sum(ProductMovement.qty)).filter(
-                ProductMovement.product_id == product.product_id,
-                ProductMovement.from_location == location.location_id
-            ).scalar() or 0
-            
-            # Calculate balance and clamp negatives to zero
-            raw_balance = incoming - outgoing
-            clamped_balance = max(0, raw_balance)
-
-            # Track if there are zero-balance entries
-            if clamped_balance == 0 and (incoming != 0 or outgoing != 0):
-                any_zero_balance = True
-
-            # Include rows where there has been any movement (incoming or outgoing)
-            # or where positive balance exists
-            if (incoming != 0 or outgoing != 0) or clamped_balance > 0:
-                balance_report.append({
-                    'product': product,
-                    'location': location,
-                    'quantity': clamped_balance
-                })
+    try:
+        as_of = parse_as_of(request.args.get('as_of'))
+    except ValueError:
+        flash('Invalid as-of date (expected YYYY-MM-DD); showing current balances.', 'warning')
+        as_of = None
+
+    # Start from the nearest checkpoint and aggregate only later movements in grouped queries
+    totals, _ = totals_as_of(as_of)
+    balance_report, any_zero_balance = build_balance_report(totals)
     
-    # Warn if there are any zero-quantity items in the report
-    if any_zero_balance:
-        flash('Some products show zero quantity at certain locations. Outgoing movements are blocked for zero stock.', 'warning')
+    # The zero-quantity warning is part of the page (not a flash) so the page stays cacheable
+    return render_template('report.html', balance_report=balance_report, as_of=as_of,
+                           any_zero_balance=any_zero_balance)
+
+# Export the balance report as CSV, honouring the same as_of date
+@app.route('/report.csv')
+def export_report_csv():
+    try:
+        as_of = parse_as_of(request.args.get('as_of'))
+    except ValueError:
+        return Response('Invalid as-of date (expected YYYY-MM-DD).', status=400, mimetype='text/plain')
 
-    return render_template('report.html', balance_report=balance_report)
+    totals, _ = totals_as_of(as_of)
+    balance_report, _ = build_balance_report(totals)
+    filename = f'balance-report-{as_of.date().isoformat()}.csv' if as_of else 'balance-report.csv'
+    return csv_download(filename, iter_csv(REPORT_COLUMNS, iter_report_rows(balance_report)))
 
 # (Removed duplicate, unreachable dashboard code that caused errors)
 
+# CLI: create or upgrade the database schema (run once per deploy).
+# Also adopts databases created before migrations existed; see `flask db` for Alembic commands.
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    upgrade_schema()
+    click.echo('Database schema is up to date.')
+
+# CLI: recompute every low-stock alert, e.g. after changing DEFAULT_REORDER_POINT
+@app.cli.command('rebuild-alerts')
+def rebuild_alerts_command():
+    count = rebuild_alerts()
+    bump_data_version()
+    db.session.commit()
+    click.echo(f'{count} open low-stock alerts.')
+
+# CLI: recompute the daily movement rollups from the movement ledger
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    count = rebuild_rollups()
+    bump_data_version()
+    db.session.commit()
+    click.echo(f'{count} daily rollup rows rebuilt.')
+
+# CLI: recompute the materialized stock balances from the movement ledger
+@app.cli.command('rebuild-balances')
+def rebuild_balances_command():
+    count = rebuild_stock_balances()
+    click.echo(f'Rebuilt {count} stock balances from the movement ledger.')
+
+# CLI: record a point-in-time checkpoint of all balances (run daily, e.g. from cron)
+@app.cli.command('create-checkpoint')
+@click.option('--at', 'taken_at', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S']),
+              default=None, help='Checkpoint time (default: the most recent midnight).')
+@click.option('--keep', type=click.IntRange(min=0), default=None, help='Afterwards keep only this many most recent checkpoints.')
+def create_checkpoint_command(taken_at, keep):
+    try:
+        count = create_checkpoint(taken_at)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f'Checkpoint recorded with {count} balances.')
+    if keep is not None:
+        click.echo(f'Pruned {prune_checkpoints(keep)} old checkpoints.')
+
+# CLI: bulk import movements from a CSV or JSONL file
+@app.cli.command('import-movements')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), default=None, help='File format (default: from extension).')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help='Rows inserted per commit.')
+def import_movements_command(path, fmt, chunk_size):
+    with open(path, 'rb') as stream:
+        result = import_movements(iter_records(stream, fmt or detect_format(path)), chunk_size=chunk_size)
+    for error in result['errors']:
+        click.echo(f"line {error['line']}: {error['error']}", err=True)
+    click.echo(f"Imported {result['imported']} movements; {result['failed']} rows rejected.")
+
+# CLI: run queued background jobs (reports, exports, imports, rebuilds)
+@app.cli.command('worker')
+@click.option('--threads', default=2, show_default=True, help='Jobs run in parallel.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds between queue checks when idle.')
+@click.option('--once', is_flag=True, help='Exit once the queue is empty.')
+def worker_command(threads, poll_interval, once):
+    click.echo(f'Worker started with {threads} threads.')
+    run_worker(app, threads=threads, poll_interval=poll_interval, once=once)
+
+# CLI: minify and fingerprint the static assets and pre-compress them (run once per
+# deploy, before starting the app). Files of the previous build are kept.
+assets_cli = AppGroup('assets', help='Build the fingerprinted static assets.')
+
+@assets_cli.command('build')
+def build_assets_command():
+    for asset in build_assets(app.static_folder):
+        sizes = ', '.join(f'{name} {asset[name]} B' for name in ('minified', 'gzip', 'brotli') if asset[name] is not None)
+        click.echo(f"{asset['source']} -> {asset['file']} ({asset['size']} B; {sizes})")
+    click.echo('Restart the app to serve the new build.')
+
+app.cli.add_command(assets_cli)
+
 if __name__ == '__main__':
     # Create directories if they don't exist
     if not os.path.exists('templates'):
         os.makedirs('templates')
     if not os.path.exists('static'):
         os.makedirs('static')
+
+    # The development server always brings the schema up to date
+    with app.app_context():
+        upgrade_schema()
         
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
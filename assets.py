@@ -0,0 +1,168 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+
+from flask import abort, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without the Brotli package only gzip variants are written
+    brotli = None
+
+# Files under static/ that go through the build, by their path under static/
+ASSETS = ('css/style.css', 'js/main.js', 'js/components.js')
+
+# Build output under static/, and the manifest mapping source paths to built files
+BUILD_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Built files never change under a given name, so browsers may keep them for a year
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+# Pre-compressed variants, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+def manifest_path(static_folder):
+    return os.path.join(static_folder, BUILD_DIR, MANIFEST_NAME)
+
+def _read_manifest(static_folder):
+    try:
+        with open(manifest_path(static_folder)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Comments out, whitespace collapsed, no spaces around punctuation. Strings in the
+# stylesheet hold no comment markers or significant runs of spaces, so this is safe.
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+# Indentation, blank lines and whole-line // comments out. Line breaks are kept so
+# automatic semicolon insertion and the in-browser JSX transform behave as before,
+# and lines inside multi-line template literals are left untouched.
+def minify_js(text):
+    lines = []
+    in_template = False
+    for line in text.splitlines():
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+def _write(path, data):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def _compressed_variants(data):
+    # mtime=0 keeps the gzip output identical between builds of the same file
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data)}
+
+# Minify every asset, name it after a hash of its content, write gzip (and brotli)
+# variants next to it and replace the manifest. Files of the previous build are
+# kept so pages rendered before a deploy can still load theirs; older ones are
+# removed. Returns one dict of sizes per asset.
+def build_assets(static_folder):
+    build_dir = os.path.join(static_folder, BUILD_DIR)
+    os.makedirs(build_dir, exist_ok=True)
+    previous = _read_manifest(static_folder)
+
+    manifest = {}
+    results = []
+    for source in ASSETS:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            text = f.read()
+        stem, extension = os.path.splitext(source)
+        data = MINIFIERS[extension](text).encode('utf-8')
+        target = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}'
+
+        path = os.path.join(build_dir, target)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write(path, data)
+        variants = _compressed_variants(data)
+        for suffix, body in variants.items():
+            _write(path + suffix, body)
+
+        manifest[source] = target
+        results.append({
+            'source': source,
+            'file': target,
+            'size': len(text.encode('utf-8')),
+            'minified': len(data),
+            'gzip': len(variants['.gz']) if '.gz' in variants else None,
+            'brotli': len(variants['.br']) if '.br' in variants else None,
+        })
+
+    _write(manifest_path(static_folder), json.dumps(manifest, indent=2, sort_keys=True).encode())
+
+    keep = {MANIFEST_NAME}
+    for target in list(manifest.values()) + list(previous.values()):
+        keep.update(os.path.normpath(target + suffix) for suffix in ('', '.gz', '.br'))
+    for root, _, files in os.walk(build_dir):
+        for name in files:
+            relative = os.path.relpath(os.path.join(root, name), build_dir)
+            if relative not in keep:
+                os.remove(os.path.join(root, name))
+    return results
+
+# Links templates to the built, fingerprinted assets and serves them with
+# far-future immutable caching and pre-compressed bodies. Without a build (or with
+# ASSET_MANIFEST off) templates fall back to the plain files under static/.
+class AssetManifest:
+    def __init__(self):
+        self.manifest = {}
+        self.directory = None
+
+    def init_app(self, app):
+        self.directory = os.path.join(app.static_folder, BUILD_DIR)
+        self.manifest = _read_manifest(app.static_folder) if app.config['ASSET_MANIFEST'] else {}
+        app.add_url_rule(f'{app.static_url_path}/{BUILD_DIR}/<path:filename>', 'asset', self.send_asset)
+        app.add_template_global(self.asset_url)
+
+    def asset_url(self, filename):
+        built = self.manifest.get(filename)
+        if built is None:
+            return url_for('static', filename=filename)
+        return url_for('asset', filename=built)
+
+    def send_asset(self, filename):
+        if filename == MANIFEST_NAME or safe_join(self.directory, filename) is None:
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0]
+        encoding = None
+        for candidate, suffix in ENCODINGS:
+            if request.accept_encodings[candidate] and os.path.isfile(os.path.join(self.directory, filename + suffix)):
+                encoding, filename = candidate, filename + suffix
+                break
+
+        response = send_from_directory(self.directory, filename, mimetype=mimetype, max_age=ASSET_MAX_AGE)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+# Shared instance; the app loads the manifest written by `flask assets build`
+asset_manifest = AssetManifest()
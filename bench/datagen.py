@@ -0,0 +1,106 @@
+# Synthetic ledger generator shared by the benchmark scripts. Also usable on its
+# own to fill a development database:
+#
+#   DATABASE_URL=sqlite:///big.db python bench/datagen.py --movements 2000000 --days 730
+#
+# Movements are written with batched core INSERTs and the movement indexes are
+# dropped for the load and rebuilt once at the end, which is several times faster
+# than maintaining six indexes row by row.
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from models import db, Product, Location, ProductMovement
+from stock import rebuild_stock_balances
+from rollups import rebuild_rollups
+from versioning import bump_data_version
+
+BATCH_SIZE = 10000
+
+# Yield batches of movement rows spread evenly over the last `days` days, newest last,
+# referencing products and locations by surrogate key. `inbound` and `outbound` are
+# the shares of receipts and issues; the rest are transfers.
+def iter_movement_batches(product_keys, location_keys, movements, days=365, inbound=0.4, outbound=0.2, seed=42):
+    if inbound < 0 or outbound < 0 or inbound + outbound > 1:
+        raise ValueError('inbound and outbound shares must be non-negative and sum to at most 1')
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=days)
+    step = timedelta(days=days) / max(1, movements)
+
+    rows = []
+    for i in range(movements):
+        kind = rng.random()
+        from_location_key = None if kind < inbound else rng.choice(location_keys)
+        to_location_key = None if inbound <= kind < inbound + outbound else rng.choice(location_keys)
+        rows.append({
+            'timestamp': start + step * i,
+            'product_key': rng.choice(product_keys),
+            'from_location_key': from_location_key,
+            'to_location_key': to_location_key,
+            'qty': rng.randint(1, 50),
+        })
+        if len(rows) == BATCH_SIZE:
+            yield rows
+            rows = []
+    if rows:
+        yield rows
+
+# Bulk-load products, locations and `movements` random movements (by default 40%
+# inward, 20% outward and 40% transfers over the last year), then materialize balances.
+# Meant for empty benchmark databases: the movement indexes are rebuilt after the load.
+def generate_ledger(products, locations, movements, seed=42, days=365, inbound=0.4, outbound=0.2,
+                    rebuild_indexes=True):
+    product_ids = [f'SKU{i:05d}' for i in range(products)]
+    location_ids = [f'LOC{i:03d}' for i in range(locations)]
+    connection = db.session.connection()
+    connection.execute(insert(Product), [{'product_id': p, 'product_name': f'Product {p}'} for p in product_ids])
+    connection.execute(insert(Location), [{'location_id': l} for l in location_ids])
+    product_keys = dict(connection.execute(select(Product.product_id, Product.id)).all())
+    location_keys = dict(connection.execute(select(Location.location_id, Location.id)).all())
+
+    indexes = list(ProductMovement.__table__.indexes) if rebuild_indexes else []
+    for index in indexes:
+        index.drop(connection, checkfirst=True)
+
+    table = ProductMovement.__table__
+    for rows in iter_movement_batches([product_keys[p] for p in product_ids], [location_keys[l] for l in location_ids],
+                                      movements, days, inbound, outbound, seed):
+        connection.execute(table.insert(), rows)
+
+    for index in indexes:
+        index.create(connection)
+    rebuild_rollups()
+    bump_data_version(catalog=True)
+    db.session.commit()
+    rebuild_stock_balances()
+    return product_ids, location_ids
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill the database at DATABASE_URL with a synthetic ledger')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--locations', type=int, default=20)
+    parser.add_argument('--movements', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--inbound', type=float, default=0.4, help='share of inward movements')
+    parser.add_argument('--outbound', type=float, default=0.2, help='share of outward movements; the rest are transfers')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app import app
+
+    with app.app_context():
+        if db.session.query(Product.product_id).first() is not None:
+            sys.exit('Refusing to load into a database that already has products.')
+        started = time.perf_counter()
+        generate_ledger(args.products, args.locations, args.movements, seed=args.seed, days=args.days,
+                        inbound=args.inbound, outbound=args.outbound)
+        print(f'Loaded {args.movements} movements in {time.perf_counter() - started:.1f} s')
@@ -0,0 +1,115 @@
+# Show the query plans of the app's hot ledger queries and check they use indexes.
+#
+#   python bench/explain_queries.py                      # throwaway SQLite with a synthetic ledger
+#   DATABASE_URL=postgresql://... python bench/explain_queries.py --no-seed
+#
+# Exits non-zero when a query scans product_movement without an index. On PostgreSQL,
+# run it against realistic data: the planner prefers sequential scans on tiny tables.
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+parser = argparse.ArgumentParser(description='EXPLAIN the main ledger queries')
+parser.add_argument('--products', type=int, default=200)
+parser.add_argument('--locations', type=int, default=20)
+parser.add_argument('--movements', type=int, default=50000)
+parser.add_argument('--no-seed', action='store_true', help='Use the existing DATABASE_URL data as-is.')
+args = parser.parse_args()
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'explain.db')}"
+
+from sqlalchemy import func, text
+
+from app import app
+from datagen import generate_ledger
+from models import db, ProductMovement
+from movement_listing import filter_movements, DEFAULT_PAGE_SIZE
+from reference_data import reference_data
+from schema import upgrade_schema
+
+# `product_id` and `location_id` are the human ids the filters take; the raw ledger
+# queries use the surrogate keys they resolve to
+def hot_queries(product_id, location_id):
+    product_key = reference_data.key('products', product_id)
+    location_key = reference_data.key('locations', location_id)
+    since = datetime.now() - timedelta(days=30)
+    no_filters = {'product_id': None, 'location_id': None, 'direction': None, 'date_from': None, 'date_to': None}
+    newest_first = (ProductMovement.timestamp.desc(), ProductMovement.movement_id.desc())
+    return [
+        ('report: incoming totals', db.session.query(
+            ProductMovement.product_key, ProductMovement.to_location_key, func.sum(ProductMovement.qty)
+        ).filter(ProductMovement.to_location_key.isnot(None)).group_by(
+            ProductMovement.product_key, ProductMovement.to_location_key)),
+        ('report: outgoing totals', db.session.query(
+            ProductMovement.product_key, ProductMovement.from_location_key, func.sum(ProductMovement.qty)
+        ).filter(ProductMovement.from_location_key.isnot(None)).group_by(
+            ProductMovement.product_key, ProductMovement.from_location_key)),
+        ('availability: incoming sum', db.session.query(func.sum(ProductMovement.qty)).filter(
+            ProductMovement.product_key == product_key, ProductMovement.to_location_key == location_key)),
+        ('availability: outgoing sum', db.session.query(func.sum(ProductMovement.qty)).filter(
+            ProductMovement.product_key == product_key, ProductMovement.from_location_key == location_key)),
+        ('movements: first page', ProductMovement.query.order_by(*newest_first).limit(DEFAULT_PAGE_SIZE + 1)),
+        ('movements: by product', filter_movements(ProductMovement.query, dict(no_filters, product_id=product_id))
+            .order_by(*newest_first).limit(DEFAULT_PAGE_SIZE + 1)),
+        ('movements: by location', filter_movements(ProductMovement.query, dict(no_filters, location_id=location_id))
+            .order_by(*newest_first).limit(DEFAULT_PAGE_SIZE + 1)),
+        ('movements: date range', filter_movements(ProductMovement.query, dict(no_filters, date_from=since))
+            .order_by(*newest_first).limit(DEFAULT_PAGE_SIZE + 1)),
+        ('delete_product: usage check', ProductMovement.query.filter_by(product_key=product_key).limit(1)),
+        ('delete_location: source check', ProductMovement.query.filter_by(from_location_key=location_key).limit(1)),
+        ('delete_location: destination check', ProductMovement.query.filter_by(to_location_key=location_key).limit(1)),
+    ]
+
+def explain(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    sql = str(compiled)
+    if compiled.positiontup:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = db.session.connection().exec_driver_sql(prefix + sql, params).fetchall()
+    return [row[-1] if db.engine.dialect.name == 'sqlite' else row[0] for row in rows]
+
+def full_scan(plan):
+    for line in plan:
+        if db.engine.dialect.name == 'sqlite':
+            if line.startswith('SCAN product_movement') and 'INDEX' not in line:
+                return True
+        elif 'Seq Scan on product_movement' in line:
+            return True
+    return False
+
+if __name__ == '__main__':
+    with app.app_context():
+        upgrade_schema()
+        if not args.no_seed:
+            print(f'Seeding {args.products} products, {args.locations} locations, {args.movements} movements ...')
+            generate_ledger(args.products, args.locations, args.movements)
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+
+        sample = ProductMovement.query.filter(ProductMovement.to_location_key.isnot(None)).first()
+        if sample is None:
+            sys.exit('No movements to explain; run without --no-seed.')
+
+        failures = []
+        for name, query in hot_queries(sample.product.product_id, sample.destination.location_id):
+            plan = explain(query)
+            print(f'\n== {name}')
+            for line in plan:
+                print(f'   {line}')
+            if full_scan(plan):
+                failures.append(name)
+
+        print()
+        if failures:
+            print('FULL SCANS: ' + ', '.join(failures))
+            sys.exit(1)
+        print('OK: every query uses an index on product_movement')
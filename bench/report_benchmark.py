@@ -0,0 +1,89 @@
+# Benchmark: legacy per-pair SUM balance report vs the grouped aggregation engine.
+#
+#   python bench/report_benchmark.py --products 200 --locations 20 --movements 50000
+#
+# Seeds a throwaway SQLite database, then reports query counts and wall time for both
+# implementations and checks that they produce identical rows.
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+parser = argparse.ArgumentParser(description='Compare balance report implementations')
+parser.add_argument('--products', type=int, default=200)
+parser.add_argument('--locations', type=int, default=20)
+parser.add_argument('--movements', type=int, default=50000)
+parser.add_argument('--seed', type=int, default=42)
+args = parser.parse_args()
+
+db_path = os.path.join(tempfile.mkdtemp(), 'report_bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+from sqlalchemy import event
+
+from app import app
+from datagen import generate_ledger
+from models import db, Product, Location, ProductMovement
+from reporting import build_balance_report
+
+query_count = 0
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    global query_count
+    query_count += 1
+
+# The original nested-loop implementation of report(), kept here for comparison
+def legacy_balance_report():
+    products = Product.query.all()
+    locations = Location.query.all()
+    balance_report = []
+    any_zero_balance = False
+    for product in products:
+        for location in locations:
+            incoming = db.session.query(db.func.sum(ProductMovement.qty)).filter(
+                ProductMovement.product_key == product.id,
+                ProductMovement.to_location_key == location.id
+            ).scalar() or 0
+            outgoing = db.session.query(db.func.sum(ProductMovement.qty)).filter(
+                ProductMovement.product_key == product.id,
+                ProductMovement.from_location_key == location.id
+            ).scalar() or 0
+            raw_balance = incoming - outgoing
+            clamped_balance = max(0, raw_balance)
+            if clamped_balance == 0 and (incoming != 0 or outgoing != 0):
+                any_zero_balance = True
+            if (incoming != 0 or outgoing != 0) or clamped_balance > 0:
+                balance_report.append({'product': product, 'location': location, 'quantity': clamped_balance})
+    return balance_report, any_zero_balance
+
+def measure(name, fn):
+    global query_count
+    db.session.expire_all()
+    query_count = 0
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f'{name:<10} queries={query_count:<8} wall={elapsed * 1000:10.1f} ms  rows={len(result[0])}')
+    return result
+
+def as_tuples(result):
+    rows, warning = result
+    return [(r['product'].product_id, r['location'].location_id, r['quantity']) for r in rows], warning
+
+if __name__ == '__main__':
+    with app.app_context():
+        print(f'Seeding {args.products} products, {args.locations} locations, {args.movements} movements ...')
+        generate_ledger(args.products, args.locations, args.movements, seed=args.seed)
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+
+        legacy = measure('legacy', legacy_balance_report)
+        grouped = measure('grouped', build_balance_report)
+
+        if as_tuples(legacy) != as_tuples(grouped):
+            print('MISMATCH: grouped report differs from legacy report')
+            sys.exit(1)
+        print('Reports match.')
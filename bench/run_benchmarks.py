@@ -0,0 +1,203 @@
+# Repeatable latency benchmarks for the main pages, run through Flask's test client.
+#
+#   python bench/run_benchmarks.py --movements 200000 --output results.json
+#   python bench/run_benchmarks.py --compare results.json
+#
+# Seeds a throwaway SQLite database (or uses DATABASE_URL with --no-seed), then
+# times each scenario and reports p50/p95/p99 latency, queries per request and
+# peak Python memory per request. Results are written as JSON tagged with the
+# current git commit; --compare prints the change against an earlier run.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+parser = argparse.ArgumentParser(description='Benchmark the main pages')
+parser.add_argument('--products', type=int, default=500)
+parser.add_argument('--locations', type=int, default=20)
+parser.add_argument('--movements', type=int, default=100000)
+parser.add_argument('--days', type=int, default=365)
+parser.add_argument('--seed', type=int, default=42)
+parser.add_argument('--iterations', type=int, default=50, help='timed requests per scenario')
+parser.add_argument('--warmup', type=int, default=3)
+parser.add_argument('--only', help='comma-separated scenario names')
+parser.add_argument('--page-cache', action='store_true', help='serve pages from the rendered-page cache')
+parser.add_argument('--no-seed', action='store_true', help='benchmark the existing database at DATABASE_URL')
+parser.add_argument('--output', help='write results as JSON to this file')
+parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+args = parser.parse_args()
+
+if not args.no_seed:
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+
+from sqlalchemy import event
+
+from app import app
+from dashboard import dashboard_snapshot
+from datagen import generate_ledger
+from models import db, Product, StockBalance
+
+query_count = 0
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    global query_count
+    query_count += 1
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+# A stocked (product, location) pair and a second location so add_movement
+# can keep transferring without running out
+def transfer_route():
+    balance = StockBalance.query.order_by(StockBalance.on_hand.desc()).first()
+    other = StockBalance.query.filter(StockBalance.location_key != balance.location_key).first()
+    return balance.product.product_id, balance.location.location_id, other.location.location_id
+
+def build_scenarios(client):
+    product_id = db.session.query(Product.product_id).order_by(Product.product_id).first()[0]
+    transfer_product, transfer_from, transfer_to = transfer_route()
+    as_of = (datetime.now().date().replace(day=1)).isoformat()
+    year_ago = (datetime.now().date() - timedelta(days=364)).isoformat()
+
+    def get(url, before=None):
+        def run():
+            if before:
+                before()
+            response = client.get(url)
+            assert response.status_code == 200, f'{url} returned {response.status_code}'
+            response.get_data()
+        return run
+
+    def add_movement():
+        response = client.post('/movements/add', data={
+            'product_id': transfer_product,
+            'from_location': transfer_from,
+            'to_location': transfer_to,
+            'qty': '1',
+        })
+        assert response.status_code == 302, f'add_movement returned {response.status_code}'
+
+    return {
+        # The dashboard cache is dropped before each request to time the computation
+        'dashboard': get('/dashboard', before=dashboard_snapshot.invalidate),
+        'dashboard_cached': get('/dashboard'),
+        'report': get('/report'),
+        'report_as_of': get(f'/report?as_of={as_of}'),
+        'movements': get('/movements'),
+        'movements_filtered': get(f'/movements?product_id={product_id}&direction=transfer'),
+        'analytics_year': get(f'/api/analytics?date_from={year_ago}'),
+        'search': get('/search?query=0012'),
+        'search_suggest': get('/api/search/suggest?q=SKU001'),
+        'add_movement': add_movement,
+    }
+
+def measure(run):
+    global query_count
+    for _ in range(args.warmup):
+        run()
+
+    timings = []
+    queries = []
+    for _ in range(args.iterations):
+        db.session.remove()
+        query_count = 0
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(query_count)
+
+    # Peak memory is taken on a separate pass since tracing slows every allocation
+    db.session.remove()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'iterations': args.iterations,
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+        'queries': max(queries),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(results, baseline=None):
+    print(f'{"scenario":<20}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}{"peak KB":>10}'
+          + (f'{"p50 vs base":>14}' if baseline else ''))
+    for name, result in results['scenarios'].items():
+        line = (f'{name:<20}{result["p50_ms"]:>10.2f}{result["p95_ms"]:>10.2f}{result["p99_ms"]:>10.2f}'
+                f'{result["queries"]:>9}{result["peak_memory_kb"]:>10.1f}')
+        if baseline:
+            previous = baseline['scenarios'].get(name)
+            if previous and previous['p50_ms']:
+                change = (result['p50_ms'] - previous['p50_ms']) / previous['p50_ms'] * 100
+                line += f'{change:>+13.1f}%'
+            else:
+                line += f'{"n/a":>14}'
+        print(line)
+
+if __name__ == '__main__':
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    with app.app_context():
+        if not args.no_seed:
+            print(f'Seeding {args.products} products, {args.locations} locations, {args.movements} movements ...')
+            generate_ledger(args.products, args.locations, args.movements, seed=args.seed, days=args.days)
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+        # Off by default so each scenario times the rendering, not a cache hit
+        app.config['PAGE_CACHE'] = args.page_cache
+
+        client = app.test_client()
+        scenarios = build_scenarios(client)
+        selected = args.only.split(',') if args.only else list(scenarios)
+        unknown = [name for name in selected if name not in scenarios]
+        if unknown:
+            sys.exit(f'Unknown scenarios: {", ".join(unknown)}')
+
+        results = {
+            'commit': git_commit(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': db.engine.dialect.name,
+            'dataset': {
+                'products': args.products,
+                'locations': args.locations,
+                'movements': args.movements,
+                'days': args.days,
+                'seed': args.seed,
+            } if not args.no_seed else None,
+            'scenarios': {},
+        }
+        for name in selected:
+            results['scenarios'][name] = measure(scenarios[name])
+
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results written to {args.output}')
@@ -0,0 +1,127 @@
+# Concurrency stress test for stock reservation.
+#
+#   python bench/stress_reservation.py --workers 16 --requests 400 --stock 500 --qty 3
+#   DATABASE_URL=postgresql://... python bench/stress_reservation.py
+#
+# Fires parallel transfers of one product out of a single location through the
+# JSON API and checks that the source balance never goes below zero, that the
+# accepted transfers never exceed the initial stock, that every request is either
+# accepted (201) or rejected for lack of stock (409), and that the materialized
+# balance still matches the ledger afterwards. Exits non-zero on any violation.
+import argparse
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+parser = argparse.ArgumentParser(description='Parallel transfers from one location')
+parser.add_argument('--workers', type=int, default=16)
+parser.add_argument('--requests', type=int, default=400)
+parser.add_argument('--stock', type=int, default=500)
+parser.add_argument('--qty', type=int, default=3)
+args = parser.parse_args()
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stress.db')}"
+
+from app import app
+from models import db, Product, Location, ProductMovement, StockBalance, DailyMovementRollup
+from reporting import ledger_totals
+from stock import apply_movement
+from versioning import bump_data_version
+
+PRODUCT = 'STRESS-SKU'
+SOURCE = 'STRESS-SRC'
+DESTINATIONS = [f'STRESS-DST-{i}' for i in range(4)]
+
+# Surrogate keys of the stress product and source location, set by setup()
+keys = {}
+
+def setup():
+    product = Product.query.filter_by(product_id=PRODUCT).first()
+    if product is None:
+        product = Product(product_id=PRODUCT, product_name='Stress test product')
+        db.session.add(product)
+    for location_id in [SOURCE] + DESTINATIONS:
+        if Location.query.filter_by(location_id=location_id).first() is None:
+            db.session.add(Location(location_id=location_id))
+    bump_data_version(catalog=True)
+    db.session.flush()
+    source = Location.query.filter_by(location_id=SOURCE).one()
+    keys.update(product=product.id, source=source.id)
+
+    db.session.query(StockBalance).filter(StockBalance.product_key == product.id).delete()
+    db.session.query(DailyMovementRollup).filter(DailyMovementRollup.product_key == product.id).delete()
+    db.session.query(ProductMovement).filter(ProductMovement.product_key == product.id).delete()
+    receipt = ProductMovement(product_key=product.id, from_location_key=None, to_location_key=source.id, qty=args.stock)
+    db.session.add(receipt)
+    apply_movement(receipt)
+    db.session.commit()
+
+# Sample the source balance continuously while transfers run
+low_water = [args.stock]
+done = threading.Event()
+
+def watch():
+    with app.app_context():
+        while not done.is_set():
+            on_hand = db.session.query(StockBalance.on_hand).filter_by(
+                product_key=keys['product'], location_key=keys['source']).scalar()
+            db.session.rollback()
+            low_water[0] = min(low_water[0], on_hand)
+
+def transfer(i):
+    client = app.test_client()
+    response = client.post('/api/v1/movements', json={
+        'product_id': PRODUCT,
+        'from_location': SOURCE,
+        'to_location': DESTINATIONS[i % len(DESTINATIONS)],
+        'qty': args.qty,
+    })
+    return response.status_code
+
+if __name__ == '__main__':
+    with app.app_context():
+        setup()
+
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        statuses = Counter(pool.map(transfer, range(args.requests)))
+    done.set()
+    watcher.join()
+
+    with app.app_context():
+        on_hand = db.session.query(StockBalance.on_hand).filter_by(
+            product_key=keys['product'], location_key=keys['source']).scalar()
+        incoming, outgoing = ledger_totals()[(keys['product'], keys['source'])]
+
+    accepted = statuses.get(201, 0)
+    rejected = statuses.get(409, 0)
+    print(f'responses: {dict(statuses)}')
+    print(f'accepted={accepted} x {args.qty} = {accepted * args.qty} of {args.stock} in stock')
+    print(f'final on_hand={on_hand}  ledger={incoming - outgoing}  lowest observed={low_water[0]}')
+
+    failures = []
+    unexpected = {status: count for status, count in statuses.items() if status not in (201, 409)}
+    if unexpected:
+        failures.append(f'unexpected responses {unexpected}')
+    if accepted + rejected != args.requests:
+        failures.append(f'{accepted} accepted + {rejected} rejected != {args.requests} requests')
+    if on_hand < 0 or low_water[0] < 0:
+        failures.append('balance went below zero')
+    if accepted * args.qty > args.stock:
+        failures.append('accepted more than the available stock')
+    if on_hand != incoming - outgoing:
+        failures.append('materialized balance disagrees with the ledger')
+    if on_hand != args.stock - accepted * args.qty:
+        failures.append('balance does not match accepted transfers')
+    if failures:
+        print('FAILED: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK: no oversell')
@@ -0,0 +1,81 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import delete, insert, func
+
+from models import db, StockCheckpoint
+from reporting import ledger_totals
+
+# How far in the past a checkpoint must be. Movements are timestamped before they
+# commit, so a checkpoint at "now" could miss ones still in flight; those would
+# never be counted, as later reports only replay movements after the checkpoint.
+CHECKPOINT_LAG = timedelta(minutes=5)
+
+# Most recent checkpoint taken at or before `as_of` (any checkpoint when None)
+def latest_checkpoint(as_of=None):
+    query = db.session.query(func.max(StockCheckpoint.taken_at))
+    if as_of is not None:
+        query = query.filter(StockCheckpoint.taken_at <= as_of)
+    return query.scalar()
+
+def checkpoint_totals(taken_at):
+    return {
+        (product_key, location_key): [qty_in, qty_out]
+        for product_key, location_key, qty_in, qty_out in db.session.query(
+            StockCheckpoint.product_key, StockCheckpoint.location_key,
+            StockCheckpoint.qty_in, StockCheckpoint.qty_out
+        ).filter(StockCheckpoint.taken_at == taken_at)
+    }
+
+# Incoming/outgoing totals per (product, location) as of a point in time: start from
+# the nearest earlier checkpoint and replay only the movements recorded after it.
+# Returns (totals, checkpoint_taken_at or None).
+def totals_as_of(as_of=None):
+    base = latest_checkpoint(as_of)
+    totals = checkpoint_totals(base) if base is not None else {}
+
+    for key, (qty_in, qty_out) in ledger_totals(after=base, until=as_of).items():
+        entry = totals.setdefault(key, [0, 0])
+        entry[0] += qty_in
+        entry[1] += qty_out
+
+    return totals, base
+
+# Record a checkpoint of every balance at `taken_at` (default: the most recent
+# midnight at least CHECKPOINT_LAG ago, closing the previous day), built
+# incrementally from the previous checkpoint. Returns the number of rows written.
+def create_checkpoint(taken_at=None):
+    latest_allowed = datetime.now() - CHECKPOINT_LAG
+    taken_at = taken_at or datetime.combine(latest_allowed.date(), time.min)
+    if taken_at > latest_allowed:
+        raise ValueError(f'Checkpoints must be at least {int(CHECKPOINT_LAG.total_seconds() // 60)} minutes in the past, '
+                         'so movements still being written are not missed.')
+
+    totals, _ = totals_as_of(taken_at)
+
+    db.session.execute(delete(StockCheckpoint).where(StockCheckpoint.taken_at == taken_at))
+    if totals:
+        db.session.execute(insert(StockCheckpoint), [
+            {'taken_at': taken_at, 'product_key': product_key, 'location_key': location_key,
+             'qty_in': qty_in, 'qty_out': qty_out}
+            for (product_key, location_key), (qty_in, qty_out) in totals.items()
+        ])
+    db.session.commit()
+    return len(totals)
+
+# Keep only the `keep` most recent checkpoints. Returns the number removed.
+def prune_checkpoints(keep):
+    if keep < 0:
+        raise ValueError('The number of checkpoints to keep cannot be negative.')
+    taken = [taken_at for (taken_at,) in db.session.query(StockCheckpoint.taken_at).distinct().order_by(
+        StockCheckpoint.taken_at.desc()
+    )]
+    stale = taken[keep:]
+    if stale:
+        db.session.execute(delete(StockCheckpoint).where(StockCheckpoint.taken_at <= stale[0]))
+        db.session.commit()
+    return len(stale)
+
+# A write that changes history at `since` makes every checkpoint at or after it
+# stale. Runs in the caller's transaction.
+def invalidate_checkpoints(since):
+    db.session.execute(delete(StockCheckpoint).where(StockCheckpoint.taken_at >= since))
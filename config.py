@@ -0,0 +1,97 @@
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.pool import NullPool
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+def database_uri():
+    uri = os.environ.get('DATABASE_URL', 'sqlite:///inventory.db')
+    if uri.startswith('postgres://'):
+        uri = uri.replace('postgres://', 'postgresql://', 1)
+    return uri
+
+# SQLAlchemy engine options from the environment. SQLite uses its default
+# single-file pool; server databases get a sized, pre-pinged, recycled pool.
+def engine_options(uri):
+    if uri.startswith('sqlite'):
+        # Wait for concurrent writers instead of failing with "database is locked"
+        return {'connect_args': {'timeout': _env_int('SQLITE_BUSY_TIMEOUT', 15)}}
+
+    options = {'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True)}
+    if _env_bool('DB_DISABLE_POOL', False):
+        # Serverless: one short-lived connection per invocation, nothing held between cold starts
+        options['poolclass'] = NullPool
+    else:
+        options.update({
+            'pool_size': _env_int('DB_POOL_SIZE', 5),
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        })
+
+    statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+    if statement_timeout and uri.startswith('postgresql'):
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'inventory_management_secret_key')
+    SQLALCHEMY_DATABASE_URI = database_uri()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', 5))
+    # Run the schema upgrade when the app starts. On by default only for SQLite;
+    # server deployments run `flask upgrade-db` as a release step instead.
+    AUTO_MIGRATE = _env_bool('AUTO_MIGRATE', SQLALCHEMY_DATABASE_URI.startswith('sqlite'))
+    # Reorder point for (product, location) pairs without their own threshold;
+    # run `flask rebuild-alerts` after changing it
+    DEFAULT_REORDER_POINT = _env_int('DEFAULT_REORDER_POINT', 10)
+    # Live feed: how often each worker polls the event log, and how long events are kept
+    EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', 1.0))
+    EVENTS_RETENTION = _env_int('EVENTS_RETENTION', 3600)
+    # Background jobs (`flask worker`): where result files go (default: instance/jobs),
+    # when a silent running job counts as interrupted, and how long finished jobs are kept
+    JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR')
+    JOB_STALE_AFTER = _env_int('JOB_STALE_AFTER', 900)
+    JOB_RETENTION_DAYS = _env_int('JOB_RETENTION_DAYS', 7)
+    # Rendered-page cache keyed on the data version: entries and total bytes kept in
+    # each worker, plus an optional directory shared by all workers on the host
+    PAGE_CACHE = _env_bool('PAGE_CACHE', True)
+    PAGE_CACHE_SIZE = _env_int('PAGE_CACHE_SIZE', 256)
+    PAGE_CACHE_MAX_BYTES = _env_int('PAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR')
+    # Link pages to the minified, fingerprinted files from `flask assets build` when a
+    # build exists; turn off while editing files under static/
+    ASSET_MANIFEST = _env_bool('ASSET_MANIFEST', True)
+    # Per-request query/render timing, Server-Timing headers and /metrics
+    INSTRUMENTATION = _env_bool('INSTRUMENTATION', False)
+    SLOW_QUERY_MS = _env_int('SLOW_QUERY_MS', 100)
+    N_PLUS_ONE_THRESHOLD = _env_int('N_PLUS_ONE_THRESHOLD', 10)
+
+# WAL lets readers proceed during writes and synchronous=NORMAL is durable
+# enough under WAL while avoiding an fsync per commit
+def configure_engine(engine):
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            if engine.url.database not in (None, '', ':memory:'):
+                cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        finally:
+            cursor.close()
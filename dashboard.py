@@ -0,0 +1,108 @@
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import select, func
+
+from models import db, Product, Location, ProductMovement, StockBalance, StockAlert
+from alerts import open_alerts, alert_to_dict
+from versioning import current_data_version
+from reference_data import reference_data
+
+# Open alerts listed on the dashboard, lowest stock relative to its reorder point first
+DASHBOARD_ALERT_LIMIT = 10
+
+# Computes every dashboard metric in a handful of aggregate queries and caches the
+# result in-process for `ttl` seconds or until the data version moves, so writes
+# from any worker show up on the next read. Writers also call invalidate() after
+# committing, which drops the cached metrics straight away.
+class DashboardSnapshot:
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+        self._version = None
+        self._expires_at = 0.0
+
+    def get(self):
+        with self._lock:
+            version = current_data_version()
+            if self._data is not None and version == self._version and time.monotonic() < self._expires_at:
+                return self._data
+
+            data = self.compute()
+            self._data = data
+            self._version = version
+            self._expires_at = time.monotonic() + self.ttl
+            return data
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+            self._version = None
+            self._expires_at = 0.0
+
+    @staticmethod
+    def compute():
+        # All four counts in a single round trip; low stock is read from the
+        # open-alerts table maintained on every write
+        product_count, location_count, movement_count, low_stock_count = db.session.execute(select(
+            select(func.count()).select_from(Product).scalar_subquery(),
+            select(func.count()).select_from(Location).scalar_subquery(),
+            select(func.count()).select_from(ProductMovement).scalar_subquery(),
+            select(func.count()).select_from(StockAlert).scalar_subquery()
+        )).one()
+
+        # Current stock per product and per location from the materialized balances,
+        # grouped on the integer keys and labelled from the in-memory catalogs
+        catalogs = reference_data.catalogs()
+        product_ids = catalogs['products'].id_by_key
+        location_ids = catalogs['locations'].id_by_key
+        stock_by_product = dict(db.session.query(
+            StockBalance.product_key, func.sum(StockBalance.on_hand)
+        ).group_by(StockBalance.product_key).all())
+        stock_by_location = sorted(
+            (location_ids[location_key], qty) for location_key, qty in db.session.query(
+                StockBalance.location_key, func.sum(StockBalance.on_hand)
+            ).group_by(StockBalance.location_key) if location_key in location_ids
+        )
+
+        product_labels = catalogs['products'].ids
+        product_keys = catalogs['products'].key_by_id
+        stock_levels = [stock_by_product.get(product_keys[product_id]) or 0 for product_id in product_labels]
+
+        recent_movements = [
+            {
+                'movement_id': movement_id,
+                'product_id': product_ids.get(product_key),
+                'from_location': location_ids.get(from_location_key),
+                'to_location': location_ids.get(to_location_key),
+                'qty': qty,
+                'timestamp': timestamp.isoformat(),
+            }
+            for movement_id, product_key, from_location_key, to_location_key, qty, timestamp in db.session.query(
+                ProductMovement.movement_id,
+                ProductMovement.product_key,
+                ProductMovement.from_location_key,
+                ProductMovement.to_location_key,
+                ProductMovement.qty,
+                ProductMovement.timestamp
+            ).order_by(ProductMovement.movement_id.desc()).limit(5)
+        ]
+
+        return {
+            'product_count': product_count,
+            'location_count': location_count,
+            'movement_count': movement_count,
+            'low_stock_count': low_stock_count,
+            'low_stock_alerts': [alert_to_dict(alert) for alert in open_alerts(limit=DASHBOARD_ALERT_LIMIT)],
+            'recent_movements': recent_movements,
+            'product_labels': product_labels,
+            'stock_levels': stock_levels,
+            'location_labels': [location_id for location_id, _ in stock_by_location],
+            'location_stock': [max(0, qty or 0) for _, qty in stock_by_location],
+            'generated_at': datetime.now().isoformat(),
+        }
+
+# Shared instance; the app sets its TTL from DASHBOARD_CACHE_TTL
+dashboard_snapshot = DashboardSnapshot()
@@ -0,0 +1,243 @@
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, insert, or_
+
+from models import db, EventLog, Location, Product, StockBalance
+from stock import pending_balance_deltas
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per SSE client before it is dropped as too slow; the browser
+# then reconnects with Last-Event-ID and replays what it missed
+SUBSCRIBER_QUEUE_SIZE = 1000
+# Ids skipped by the poller are re-checked this long in case their transaction
+# commits after a later one (PostgreSQL sequences do not follow commit order)
+GAP_TIMEOUT = 10.0
+# Most skipped ids tracked at once
+MAX_GAPS = 1000
+# Movements carried by a batch event, latest first; enough for the dashboard's
+# recent-movements list
+BATCH_EVENT_MOVEMENTS = 5
+
+# Human ids of the given product and location surrogate keys, read through the
+# caller's session and so on its own connection and transaction
+def _reference_ids(product_keys, location_keys):
+    products = dict(db.session.query(Product.id, Product.product_id).filter(
+        Product.id.in_(product_keys))) if product_keys else {}
+    locations = dict(db.session.query(Location.id, Location.location_id).filter(
+        Location.id.in_(location_keys))) if location_keys else {}
+    return products, locations
+
+def _movement_dict(movement, products, locations):
+    return {
+        'movement_id': movement.movement_id,
+        'timestamp': movement.timestamp.isoformat(),
+        'product_id': products.get(movement.product_key),
+        'from_location': locations.get(movement.from_location_key),
+        'to_location': locations.get(movement.to_location_key),
+        'qty': movement.qty,
+    }
+
+# Queue changes to movements to be written to the event log when the current
+# transaction commits, one event per movement. `action` is created, updated or
+# deleted. Ids are resolved here so the commit hook never needs the reference-data
+# catalog, whose lock may be held by a thread waiting for the write lock that
+# the committing transaction already has.
+def record_movement_events(action, movements):
+    if any(movement.movement_id is None for movement in movements):
+        db.session.flush()
+    products, locations = _reference_ids(
+        {movement.product_key for movement in movements},
+        {key for movement in movements for key in (movement.from_location_key, movement.to_location_key) if key},
+    )
+    pending = db.session.info.setdefault('pending_events', [])
+    for movement in movements:
+        pending.append(('movement', {'action': action, 'movement': _movement_dict(movement, products, locations)}))
+
+def record_movement_event(action, movement):
+    record_movement_events(action, [movement])
+
+# Queue a single event for a batch of created movements, such as one import chunk:
+# the number created and the latest few. `movements` are objects or rows with the
+# ProductMovement columns.
+def record_movement_batch_event(movements):
+    if not movements:
+        return
+    latest = sorted(movements, key=lambda movement: movement.movement_id, reverse=True)[:BATCH_EVENT_MOVEMENTS]
+    products, locations = _reference_ids(
+        {movement.product_key for movement in latest},
+        {key for movement in latest for key in (movement.from_location_key, movement.to_location_key) if key},
+    )
+    db.session.info.setdefault('pending_events', []).append(('movements', {
+        'action': 'created',
+        'count': len(movements),
+        'movements': [_movement_dict(movement, products, locations) for movement in latest],
+    }))
+
+# The balance deltas of a transaction, with the new on-hand of each pair and the
+# new totals of the affected products and locations so clients never drift.
+# Runs in the commit hook, so it reads only through the committing session and
+# joins in the human ids rather than asking the reference-data catalog.
+def _balances_payload(deltas):
+    product_keys = sorted({product_key for product_key, _ in deltas})
+    location_keys = sorted({location_key for _, location_key in deltas})
+    balances = {
+        (product_key, location_key): (product_id, location_id, qty)
+        for product_key, location_key, product_id, location_id, qty in db.session.query(
+            StockBalance.product_key, StockBalance.location_key, Product.product_id, Location.location_id,
+            StockBalance.on_hand
+        ).join(Product, Product.id == StockBalance.product_key).join(
+            Location, Location.id == StockBalance.location_key
+        ).filter(StockBalance.product_key.in_(product_keys), StockBalance.location_key.in_(location_keys))
+    }
+    products = db.session.query(Product.product_id, func.sum(StockBalance.on_hand)).join(
+        Product, Product.id == StockBalance.product_key).filter(
+        StockBalance.product_key.in_(product_keys)).group_by(Product.product_id)
+    locations = db.session.query(Location.location_id, func.sum(StockBalance.on_hand)).join(
+        Location, Location.id == StockBalance.location_key).filter(
+        StockBalance.location_key.in_(location_keys)).group_by(Location.location_id)
+    return {
+        'balances': sorted((
+            {'product_id': balances[key][0], 'location_id': balances[key][1], 'delta': delta,
+             'on_hand': balances[key][2]}
+            for key, delta in deltas.items() if delta and key in balances
+        ), key=lambda balance: (balance['product_id'], balance['location_id'])),
+        'products': {product_id: total or 0 for product_id, total in products},
+        'locations': {location_id: total or 0 for location_id, total in locations},
+    }
+
+# Write the transaction's pending events to the event log inside the same commit,
+# so only committed changes ever reach the feed. Like the alerts and rollups
+# hooks it still queries (for the balances payload), but only through the
+# committing session; nothing here may take a lock or open another connection.
+@event.listens_for(db.session, 'before_commit')
+def write_pending_events(session):
+    events = session.info.pop('pending_events', [])
+    deltas = pending_balance_deltas(session)
+    if any(deltas.values()):
+        events.append(('balances', _balances_payload(deltas)))
+    if events:
+        now = datetime.now()
+        session.execute(insert(EventLog), [
+            {'created_at': now, 'kind': kind, 'payload': json.dumps(payload)} for kind, payload in events
+        ])
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def forget_pending_events(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('pending_events', None)
+
+def format_sse(event_id, kind, payload):
+    return f'id: {event_id}\nevent: {kind}\ndata: {payload}\n\n'
+
+# Events logged after `last_id`, oldest first, for clients resuming with Last-Event-ID
+def events_since(last_id, limit=1000):
+    return [
+        (row.id, row.kind, row.payload)
+        for row in EventLog.query.filter(EventLog.id > last_id).order_by(EventLog.id).limit(limit)
+    ]
+
+def latest_event_id():
+    return db.session.query(func.max(EventLog.id)).scalar() or 0
+
+class Subscription:
+    def __init__(self):
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = False
+
+# In-process pub/sub for SSE clients. One poller thread per worker reads new
+# rows from the event log and fans them out to that worker's subscribers, so
+# every gunicorn worker sees the events committed by all the others. The poller
+# only runs while the worker has subscribers.
+class EventBroker:
+    def __init__(self, poll_interval=1.0, retention=3600):
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.app = None
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+
+    def init_app(self, app):
+        self.app = app
+        self.poll_interval = app.config['EVENTS_POLL_INTERVAL']
+        self.retention = app.config['EVENTS_RETENTION']
+
+    def subscribe(self):
+        subscription = Subscription()
+        with self._lock:
+            self._subscribers.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                # Start from the current end of the log, read before any backlog the
+                # caller replays so nothing can fall between the two
+                self._thread = threading.Thread(target=self._run, args=(latest_event_id(),),
+                                                name='event-poller', daemon=True)
+                self._thread.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_id, kind, payload):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait((event_id, kind, payload))
+            except queue.Full:
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+
+    def _run(self, last_id):
+        gaps = {}
+        last_prune = time.monotonic()
+
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                with self.app.app_context():
+                    last_id = self._poll(last_id, gaps)
+                    if time.monotonic() - last_prune > 60:
+                        self._prune()
+                        last_prune = time.monotonic()
+                    db.session.remove()
+            except Exception:
+                logger.exception('Event poller failed; retrying')
+            time.sleep(self.poll_interval)
+
+    # Publish rows logged after last_id, plus any late commits filling earlier gaps
+    def _poll(self, last_id, gaps):
+        now = time.monotonic()
+        for event_id in [event_id for event_id, seen in gaps.items() if now - seen > GAP_TIMEOUT]:
+            del gaps[event_id]
+
+        condition = EventLog.id > last_id
+        if gaps:
+            condition = or_(condition, EventLog.id.in_(list(gaps)))
+        rows = EventLog.query.filter(condition).order_by(EventLog.id).all()
+
+        for row in rows:
+            gaps.pop(row.id, None)
+            if row.id > last_id:
+                for missing in range(max(last_id + 1, row.id - MAX_GAPS), row.id):
+                    gaps[missing] = now
+                last_id = row.id
+            self.publish(row.id, row.kind, row.payload)
+        return last_id
+
+    def _prune(self):
+        cutoff = datetime.now() - timedelta(seconds=self.retention)
+        db.session.execute(delete(EventLog).where(EventLog.created_at < cutoff))
+        db.session.commit()
+
+# Shared instance; the app configures it from EVENTS_POLL_INTERVAL and EVENTS_RETENTION
+event_broker = EventBroker()
@@ -0,0 +1,70 @@
+import csv
+import io
+
+from models import db, ProductMovement
+from movement_listing import filter_movements
+from reference_data import reference_data
+
+# Rows fetched from the database per round trip while streaming
+EXPORT_BATCH_SIZE = 1000
+# Characters of CSV sent to the client per write
+CSV_CHUNK_SIZE = 64 * 1024
+
+MOVEMENT_COLUMNS = ('movement_id', 'timestamp', 'product_id', 'from_location', 'to_location', 'qty')
+REPORT_COLUMNS = ('product_id', 'product_name', 'location_id', 'quantity')
+
+# Spreadsheet apps evaluate cells starting with these characters as formulas
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+# Encode rows as CSV in chunks of roughly `chunk_size` characters so the
+# response never holds the whole file
+def iter_csv(header, rows, chunk_size=CSV_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def take():
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([_cell(value) for value in row])
+        if buffer.tell() >= chunk_size:
+            yield take()
+    yield take()
+
+# Filtered movements, newest first like the movements page, read in batches
+# through a server-side cursor instead of loading the whole ledger
+def iter_movement_rows(filters):
+    query = filter_movements(db.session.query(
+        ProductMovement.movement_id,
+        ProductMovement.timestamp,
+        ProductMovement.product_key,
+        ProductMovement.from_location_key,
+        ProductMovement.to_location_key,
+        ProductMovement.qty
+    ), filters).order_by(
+        ProductMovement.timestamp.desc(), ProductMovement.movement_id.desc()
+    ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    # Keys are mapped back to ids from the in-memory catalogs rather than joined
+    catalogs = reference_data.catalogs()
+    products = catalogs['products'].id_by_key
+    locations = catalogs['locations'].id_by_key
+    for movement_id, timestamp, product_key, from_location_key, to_location_key, qty in query:
+        yield (movement_id, timestamp.isoformat(sep=' ', timespec='seconds'), products.get(product_key),
+               locations.get(from_location_key), locations.get(to_location_key), qty)
+
+# Balance report rows as built by build_balance_report
+def iter_report_rows(balance_report):
+    for row in balance_report:
+        yield row['product'].product_id, row['product'].product_name, row['location'].location_id, row['quantity']
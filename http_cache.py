@@ -0,0 +1,172 @@
+import glob
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session
+
+from assets import manifest_path
+from versioning import current_data_version
+
+# Bodies larger than this are served fresh instead of cached
+MAX_ENTRY_BYTES = 2 * 1024 * 1024
+
+# Bounded in-process LRU of rendered bodies, limited by entry count and total size
+class LRUCache:
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value):
+        body = value[1]
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = value
+            self._size += len(body)
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+# Optional second level shared by every worker on the host: one file per entry,
+# written atomically, oldest files removed once there are more than `max_entries`
+class DiskCache:
+    def __init__(self, directory, max_entries=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + '.page')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                mimetype, _, body = f.read().partition(b'\n')
+        except OSError:
+            return None
+        return mimetype.decode(), body
+
+    def set(self, key, value):
+        mimetype, body = value
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(mimetype.encode() + b'\n' + body)
+        os.replace(temp_path, self._path(key))
+
+        files = glob.glob(os.path.join(self.directory, '*.page'))
+        if len(files) > self.max_entries:
+            files.sort(key=lambda path: os.path.getmtime(path))
+            for path in files[:len(files) - self.max_entries]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+# Caches rendered GET pages keyed on (release, endpoint, query args, data version).
+# Every write bumps the data version in its own transaction, so a stored page is
+# valid exactly until the next write and never needs explicit invalidation; the
+# release keeps pages on a shared disk cache from outliving a deploy. Responses
+# carry a weak ETag of the release and data version and are revalidated by the
+# browser on every visit, which costs one primary-key lookup when nothing changed.
+class PageCache:
+    def __init__(self):
+        self.memory = LRUCache()
+        self.disk = None
+        self.release = ''
+
+    def init_app(self, app):
+        self.memory = LRUCache(app.config['PAGE_CACHE_SIZE'], app.config['PAGE_CACHE_MAX_BYTES'])
+        self.disk = DiskCache(app.config['PAGE_CACHE_DIR']) if app.config['PAGE_CACHE_DIR'] else None
+        self.release = self._release_token(app)
+
+    # Changes whenever templates or the asset build change, so a deploy never
+    # revalidates old HTML or keeps pages pointing at previous asset files
+    @staticmethod
+    def _release_token(app):
+        digest = hashlib.sha1()
+        for root, _, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                digest.update(f'{path}:{os.path.getmtime(path)}'.encode())
+        manifest = manifest_path(app.static_folder)
+        if os.path.exists(manifest):
+            digest.update(f'{manifest}:{os.path.getmtime(manifest)}'.encode())
+        return digest.hexdigest()[:8]
+
+    def _lookup(self, key):
+        entry = self.memory.get(key)
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None:
+                self.memory.set(key, entry)
+        return entry
+
+    def _store(self, key, entry):
+        self.memory.set(key, entry)
+        if self.disk is not None:
+            self.disk.set(key, entry)
+
+    # Use as @page_cache.cached, or @page_cache.cached(vary=callable) for pages that
+    # also depend on something besides the request and the data, such as today's
+    # date; the callable's string result then goes into the cache key and the ETag.
+    def cached(self, view=None, vary=None):
+        if view is None:
+            return lambda view: self.cached(view, vary)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pages about to show flash messages are personal to this browser
+            if not current_app.config['PAGE_CACHE'] or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            version = current_data_version()
+            extra = vary() if vary is not None else ''
+            etag = f'{self.release}-v{version}' + (f'-{extra}' if extra else '')
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag, weak=True)
+                response.cache_control.no_cache = True
+                return response
+
+            key = (self.release, request.endpoint, tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))), version, extra)
+            entry = self._lookup(key)
+            if entry is not None:
+                response = current_app.response_class(entry[1], mimetype=entry[0])
+                response.headers['X-Cache'] = 'HIT'
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                # A modified session means the view flashed a message (or showed one)
+                if response.status_code == 200 and not response.direct_passthrough and not session.modified:
+                    body = response.get_data()
+                    if len(body) <= MAX_ENTRY_BYTES:
+                        self._store(key, (response.mimetype, body))
+                response.headers['X-Cache'] = 'MISS'
+
+            response.set_etag(etag, weak=True)
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+
+# Shared instance; the app configures it from the PAGE_CACHE settings
+page_cache = PageCache()
@@ -0,0 +1,193 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models import db, Product, Location, ProductMovement, StockBalance
+from stock import adjust_balance, InsufficientStock
+from versioning import bump_data_version
+from checkpoints import invalidate_checkpoints
+from rollups import record_movements
+from events import record_movement_batch_event
+
+DEFAULT_CHUNK_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+
+# Guess the file format from its name, defaulting to CSV
+def detect_format(filename):
+    name = (filename or '').lower()
+    if name.endswith('.jsonl') or name.endswith('.ndjson') or name.endswith('.json'):
+        return 'jsonl'
+    return 'csv'
+
+# Stream (line_number, record) pairs from a binary file object without reading it all.
+# A file that is not UTF-8 yields one error record where decoding failed and ends there.
+def iter_records(stream, fmt='csv'):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    line_number = 0
+    try:
+        for line_number, record in _parse_records(text, fmt):
+            yield line_number, record
+    except UnicodeDecodeError:
+        yield line_number + 1, ValueError('File is not valid UTF-8 text; no further lines were read')
+
+def _parse_records(text, fmt):
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f'Invalid JSON: {e}')
+                continue
+            yield line_number, record if isinstance(record, dict) else ValueError('Expected a JSON object')
+    else:
+        reader = csv.DictReader(text)
+        for record in reader:
+            # Header is line 1, so data rows start at line 2
+            yield reader.line_num, record
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+# Validate one record against the preloaded {id: key} references and running balances.
+# Returns a row dict of surrogate keys ready for insert, or raises ValueError with the reason.
+def _validate(record, product_keys, location_keys, balances):
+    product_id = _clean(record.get('product_id'))
+    from_location = _clean(record.get('from_location'))
+    to_location = _clean(record.get('to_location'))
+
+    if not product_id:
+        raise ValueError('Missing product_id')
+    if product_id not in product_keys:
+        raise ValueError(f'Unknown product "{product_id}"')
+    if not from_location and not to_location:
+        raise ValueError('Either source or destination location must be specified')
+    for location_id in (from_location, to_location):
+        if location_id and location_id not in location_keys:
+            raise ValueError(f'Unknown location "{location_id}"')
+
+    try:
+        qty = int(_clean(record.get('qty')) or '')
+    except ValueError:
+        raise ValueError(f'Invalid quantity "{record.get("qty")}"')
+    if qty <= 0:
+        raise ValueError('Quantity must be a positive number')
+
+    timestamp = _clean(record.get('timestamp'))
+    if timestamp:
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            raise ValueError(f'Invalid timestamp "{timestamp}"')
+        if timestamp.tzinfo is not None:
+            # Stored timestamps are naive server-local times, like datetime.now()
+            timestamp = timestamp.astimezone().replace(tzinfo=None)
+    else:
+        timestamp = datetime.now()
+
+    product_key = product_keys[product_id]
+    from_location_key = location_keys.get(from_location)
+    if from_location:
+        available = balances.get((product_key, from_location_key), 0)
+        if qty > available:
+            raise ValueError(f'Insufficient stock at {from_location}. Available: {max(0, available)}')
+
+    return {
+        'product_key': product_key,
+        'from_location_key': from_location_key,
+        'to_location_key': location_keys.get(to_location),
+        'qty': qty,
+        'timestamp': timestamp,
+    }
+
+# Insert one chunk with a single executemany, book its net balance deltas and
+# queue one live-feed event for the whole chunk. Net decrements are conditional,
+# so a chunk validated against a balance that a concurrent writer has since
+# consumed raises InsufficientStock instead of overselling.
+def _flush_chunk(rows, deltas):
+    if not rows:
+        return
+    # Back-dated rows change history covered by existing checkpoints
+    invalidate_checkpoints(min(row['timestamp'] for row in rows))
+    movements = db.session.execute(insert(ProductMovement).returning(
+        ProductMovement.movement_id, ProductMovement.timestamp, ProductMovement.product_key,
+        ProductMovement.from_location_key, ProductMovement.to_location_key, ProductMovement.qty
+    ), rows).all()
+    record_movements(rows)
+    for (product_key, location_key), delta in deltas.items():
+        adjust_balance(product_key, location_key, delta, reserve=True)
+    record_movement_batch_event(movements)
+    bump_data_version()
+    db.session.commit()
+
+def _load_balances():
+    return {
+        (product_key, location_key): on_hand
+        for product_key, location_key, on_hand in db.session.query(
+            StockBalance.product_key, StockBalance.location_key, StockBalance.on_hand
+        )
+    }
+
+# Import movements from an iterable of (line_number, record) pairs.
+# Valid rows are inserted in chunks with one commit per chunk; invalid rows are
+# skipped and reported. `on_chunk(imported, failed)` is called after each commit.
+# Returns {'imported': n, 'failed': n, 'errors': [...]}.
+def import_movements(records, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+    product_keys = dict(db.session.query(Product.product_id, Product.id))
+    location_keys = dict(db.session.query(Location.location_id, Location.id))
+    balances = _load_balances()
+
+    imported = 0
+    errors = []
+    rows = []
+    lines = []
+    deltas = {}
+
+    def flush():
+        nonlocal balances
+        try:
+            _flush_chunk(rows, deltas)
+        except InsufficientStock as e:
+            # Stock changed underneath us: drop the chunk and resync the running balances
+            db.session.rollback()
+            errors.extend({'line': line_number, 'error': f'Chunk rolled back: {e}'} for line_number in lines)
+            balances = _load_balances()
+            return 0
+        return len(rows)
+
+    for line_number, record in records:
+        try:
+            if isinstance(record, Exception):
+                raise record
+            row = _validate(record, product_keys, location_keys, balances)
+        except ValueError as e:
+            errors.append({'line': line_number, 'error': str(e)})
+            continue
+
+        # Keep the running balance current so later rows see earlier ones
+        for location_key, delta in ((row['from_location_key'], -row['qty']), (row['to_location_key'], row['qty'])):
+            if location_key:
+                key = (row['product_key'], location_key)
+                balances[key] = balances.get(key, 0) + delta
+                deltas[key] = deltas.get(key, 0) + delta
+
+        rows.append(row)
+        lines.append(line_number)
+        if len(rows) >= chunk_size:
+            imported += flush()
+            rows, lines, deltas = [], [], {}
+            if on_chunk:
+                on_chunk(imported, len(errors))
+
+    imported += flush()
+
+    errors.sort(key=lambda error: error['line'])
+    return {'imported': imported, 'failed': len(errors), 'errors': errors}
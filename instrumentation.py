@@ -0,0 +1,181 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import Response, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Statements kept per request for the slow-request log line
+SLOWEST_KEPT = 3
+
+def _normalize(statement):
+    # Collapse whitespace so the same statement always counts as one key
+    return re.sub(r'\s+', ' ', statement).strip()
+
+# Times template rendering for the current request
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        if not has_request_context() or 'request_metrics' not in g:
+            return super().render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            g.request_metrics['render_time'] += time.perf_counter() - started
+
+# Opt-in per-request profiling. Every SQL statement is timed through the engine's
+# cursor events and every template render through TimedTemplate; after each request
+# the totals go out as a Server-Timing header and are folded into process-wide
+# counters served at /metrics in Prometheus text format. Statements repeated more
+# than `n_plus_one_threshold` times in one request are logged as likely N+1 queries.
+# The per-query cost is two perf_counter() calls and a Counter update.
+class Instrumentation:
+    def __init__(self, slow_query_ms=100, n_plus_one_threshold=10):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._duration_sum = Counter()
+        self._duration_buckets = Counter()
+        self._queries = Counter()
+        self._db_time = Counter()
+        self._render_time = Counter()
+        self._n_plus_one = Counter()
+        self._slow_queries = Counter()
+
+    def init_app(self, app, engine):
+        self.slow_query_ms = app.config['SLOW_QUERY_MS']
+        self.n_plus_one_threshold = app.config['N_PLUS_ONE_THRESHOLD']
+
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None and has_request_context() and 'request_metrics' in g:
+            context.query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'query_started', None)
+        if started is None or not has_request_context() or 'request_metrics' not in g:
+            return
+        elapsed = time.perf_counter() - started
+        metrics = g.request_metrics
+        metrics['query_count'] += 1
+        metrics['db_time'] += elapsed
+        metrics['statements'][statement] += 1
+
+        slowest = metrics['slowest']
+        if len(slowest) < SLOWEST_KEPT or elapsed > slowest[-1][0]:
+            slowest.append((elapsed, statement))
+            slowest.sort(key=lambda item: item[0], reverse=True)
+            del slowest[SLOWEST_KEPT:]
+
+    def _start_request(self):
+        g.request_metrics = {
+            'started': time.perf_counter(),
+            'query_count': 0,
+            'db_time': 0.0,
+            'render_time': 0.0,
+            'statements': Counter(),
+            'slowest': [],
+        }
+
+    def _finish_request(self, response):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+        total = time.perf_counter() - metrics['started']
+        endpoint = request.endpoint or 'unmatched'
+
+        response.headers.add('Server-Timing', ', '.join((
+            f'db;dur={metrics["db_time"] * 1000:.1f};desc="{metrics["query_count"]} queries"',
+            f'render;dur={metrics["render_time"] * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        )))
+
+        repeated = [(statement, count) for statement, count in metrics['statements'].items()
+                    if count > self.n_plus_one_threshold]
+        for statement, count in repeated:
+            logger.warning('Possible N+1 in %s: statement ran %d times: %s',
+                           endpoint, count, _normalize(statement)[:200])
+
+        slow = [(elapsed, statement) for elapsed, statement in metrics['slowest']
+                if elapsed * 1000 >= self.slow_query_ms]
+        for elapsed, statement in slow:
+            logger.warning('Slow query in %s (%.1f ms): %s', endpoint, elapsed * 1000, _normalize(statement)[:200])
+
+        with self._lock:
+            key = (endpoint, request.method, str(response.status_code))
+            self._requests[key] += 1
+            self._duration_sum[endpoint] += total
+            for bound in DURATION_BUCKETS:
+                if total <= bound:
+                    self._duration_buckets[(endpoint, bound)] += 1
+            self._queries[endpoint] += metrics['query_count']
+            self._db_time[endpoint] += metrics['db_time']
+            self._render_time[endpoint] += metrics['render_time']
+            self._n_plus_one[endpoint] += len(repeated)
+            self._slow_queries[endpoint] += len(slow)
+        return response
+
+    # Prometheus text exposition of this process's counters
+    def render_metrics(self):
+        with self._lock:
+            requests = dict(self._requests)
+            duration_sum = dict(self._duration_sum)
+            duration_buckets = dict(self._duration_buckets)
+            per_endpoint = {
+                'db_queries_total': ('SQL statements executed', dict(self._queries)),
+                'db_time_seconds_total': ('Time spent in SQL statements', dict(self._db_time)),
+                'render_time_seconds_total': ('Time spent rendering templates', dict(self._render_time)),
+                'n_plus_one_total': ('Statements repeated past the N+1 threshold within one request', dict(self._n_plus_one)),
+                'slow_queries_total': (f'Statements slower than {self.slow_query_ms} ms', dict(self._slow_queries)),
+            }
+
+        lines = [
+            '# HELP inventory_http_requests_total HTTP requests handled.',
+            '# TYPE inventory_http_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'inventory_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP inventory_http_request_duration_seconds Request handling time.',
+            '# TYPE inventory_http_request_duration_seconds histogram',
+        ]
+        counts = Counter()
+        for (endpoint, method, status), count in requests.items():
+            counts[endpoint] += count
+        for endpoint in sorted(counts):
+            for bound in DURATION_BUCKETS:
+                lines.append(f'inventory_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} '
+                             f'{duration_buckets.get((endpoint, bound), 0)}')
+            lines.append(f'inventory_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {counts[endpoint]}')
+            lines.append(f'inventory_http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {duration_sum.get(endpoint, 0.0):.6f}')
+            lines.append(f'inventory_http_request_duration_seconds_count{{endpoint="{endpoint}"}} {counts[endpoint]}')
+
+        for name, (help_text, values) in per_endpoint.items():
+            lines.append(f'# HELP inventory_{name} {help_text}.')
+            lines.append(f'# TYPE inventory_{name} counter')
+            for endpoint, value in sorted(values.items()):
+                value = f'{value:.6f}' if isinstance(value, float) else value
+                lines.append(f'inventory_{name}{{endpoint="{endpoint}"}} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# Shared instance; the app enables it when INSTRUMENTATION is set
+instrumentation = Instrumentation()
@@ -0,0 +1,230 @@
+import csv
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+
+from models import db, Job, ProductMovement
+from checkpoints import totals_as_of
+from exports import iter_csv, iter_movement_rows, iter_report_rows, MOVEMENT_COLUMNS, REPORT_COLUMNS
+from importer import iter_records, import_movements, DEFAULT_CHUNK_SIZE
+from movement_listing import parse_movement_filters, filter_movements
+from reporting import build_balance_report
+from stock import rebuild_stock_balances
+
+logger = logging.getLogger(__name__)
+
+# Errors kept in an import job's JSON result; the full list goes to its result file
+MAX_RESULT_ERRORS = 100
+# Rows written between progress updates of an export job
+PROGRESS_EVERY = 10000
+
+JOB_TYPES = {}
+
+# Register a job handler under `kind`. Handlers take (job, **params), report
+# progress through job_progress() and may write a result file with result_path().
+def job_type(kind):
+    def register(handler):
+        JOB_TYPES[kind] = handler
+        return handler
+    return register
+
+def results_dir():
+    path = current_app.config['JOB_RESULTS_DIR']
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# Where a job keeps a file named `name` (its input upload or its result)
+def result_path(job, name):
+    return os.path.join(results_dir(), f'{job.id}-{name}')
+
+# Queue a job. Runs in the caller's transaction; the job is visible to workers once it commits.
+def submit_job(kind, params=None):
+    if kind not in JOB_TYPES:
+        raise ValueError(f'Unknown job type "{kind}"')
+    job = Job(kind=kind, params=json.dumps(params or {}), status='queued', progress=0, message='Waiting for a worker')
+    db.session.add(job)
+    db.session.flush()
+    return job
+
+# Job status is written on its own connection so updates never commit (or wait on)
+# the handler's work, e.g. while an export is still streaming rows
+def _update_job(job_id, **values):
+    with db.engine.begin() as connection:
+        connection.execute(update(Job).where(Job.id == job_id).values(**values))
+
+# Record progress (0-100) and a short status message; also the worker's heartbeat.
+# On SQLite call it between the handler's write transactions, never inside one.
+def job_progress(job, progress, message=None):
+    values = {'progress': max(0, min(100, int(progress))), 'heartbeat_at': datetime.now()}
+    if message is not None:
+        values['message'] = message[:200]
+    _update_job(job.id, **values)
+
+# Claim the oldest queued job for `worker`. The UPDATE only matches while the job
+# is still queued, so two workers racing for the same row cannot both win.
+def claim_next_job(worker):
+    while True:
+        job_id = db.session.query(Job.id).filter(Job.status == 'queued').order_by(Job.id).limit(1).scalar()
+        if job_id is None:
+            return None
+        now = datetime.now()
+        claimed = db.session.execute(update(Job).where(Job.id == job_id, Job.status == 'queued').values(
+            status='running', worker=worker, started_at=now, heartbeat_at=now, message='Started'
+        )).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, job_id)
+
+def run_job(job):
+    handler = JOB_TYPES.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f'Unknown job type "{job.kind}"')
+        result = handler(job, **json.loads(job.params))
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Job %s (%s) failed', job.id, job.kind)
+        _update_job(job.id, status='failed', error=str(e), message='Failed', finished_at=datetime.now())
+        return
+    _update_job(job.id, status='succeeded', progress=100, message='Done',
+                result=json.dumps(result) if result is not None else None, finished_at=datetime.now())
+
+# Fail jobs whose worker stopped sending heartbeats; imports are not safe to rerun blindly
+def fail_stale_jobs(stale_after):
+    cutoff = datetime.now() - timedelta(seconds=stale_after)
+    count = db.session.execute(update(Job).where(Job.status == 'running', Job.heartbeat_at < cutoff).values(
+        status='failed', error='The worker running this job stopped.', message='Interrupted', finished_at=datetime.now()
+    )).rowcount
+    db.session.commit()
+    return count
+
+# Delete finished jobs older than `days` days together with their files
+def prune_jobs(days):
+    cutoff = datetime.now() - timedelta(days=days)
+    old = Job.query.filter(Job.status.in_(('succeeded', 'failed')), Job.finished_at < cutoff).all()
+    prefixes = tuple(f'{job.id}-' for job in old)
+    if prefixes:
+        directory = results_dir()
+        for name in os.listdir(directory):
+            if name.startswith(prefixes):
+                os.remove(os.path.join(directory, name))
+        for job in old:
+            db.session.delete(job)
+        db.session.commit()
+    return len(old)
+
+# Run queued jobs on `threads` threads until stopped. With once=True, exit when the queue is empty.
+def run_worker(app, threads=2, poll_interval=1.0, once=False, stop=None):
+    stop = stop or threading.Event()
+    name = f'{socket.gethostname()}:{os.getpid()}'
+
+    with app.app_context():
+        failed = fail_stale_jobs(app.config['JOB_STALE_AFTER'])
+        if failed:
+            logger.warning('Marked %d interrupted jobs as failed', failed)
+        prune_jobs(app.config['JOB_RETENTION_DAYS'])
+
+    def work(index):
+        worker = f'{name}/{index}'
+        while not stop.is_set():
+            with app.app_context():
+                job = claim_next_job(worker)
+                if job is not None:
+                    logger.info('%s running job %s (%s)', worker, job.id, job.kind)
+                    run_job(job)
+                    continue
+            if once:
+                return
+            stop.wait(poll_interval)
+
+    pool = [threading.Thread(target=work, args=(index,), name=f'job-worker-{index}', daemon=True)
+            for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    try:
+        for thread in pool:
+            while thread.is_alive():
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        stop.set()
+        for thread in pool:
+            thread.join()
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'result_name': job.result_name,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def _write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for chunk in iter_csv(header, rows):
+            f.write(chunk)
+
+@job_type('report_csv')
+def report_csv_job(job, as_of=None):
+    as_of = datetime.fromisoformat(as_of) if as_of else None
+    job_progress(job, 10, 'Aggregating balances')
+    totals, _ = totals_as_of(as_of)
+    balance_report, _ = build_balance_report(totals)
+
+    job_progress(job, 60, f'Writing {len(balance_report)} rows')
+    name = f'balance-report-{as_of.date().isoformat()}.csv' if as_of else 'balance-report.csv'
+    _write_csv(result_path(job, name), REPORT_COLUMNS, iter_report_rows(balance_report))
+    _update_job(job.id, result_name=name)
+    return {'rows': len(balance_report)}
+
+@job_type('movements_csv')
+def movements_csv_job(job, filters=None):
+    parsed, _ = parse_movement_filters(filters or {})
+    total = filter_movements(ProductMovement.query, parsed).count()
+    job_progress(job, 0, f'Exporting {total} movements')
+
+    def rows():
+        for count, row in enumerate(iter_movement_rows(parsed), start=1):
+            if count % PROGRESS_EVERY == 0:
+                job_progress(job, count * 100 // max(1, total), f'Exported {count} of {total} movements')
+            yield row
+
+    _write_csv(result_path(job, 'movements.csv'), MOVEMENT_COLUMNS, rows())
+    _update_job(job.id, result_name='movements.csv')
+    return {'rows': total}
+
+@job_type('import_movements')
+def import_movements_job(job, path, fmt='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    size = os.path.getsize(path) or 1
+    with open(path, 'rb') as stream:
+        def on_chunk(imported, failed):
+            job_progress(job, stream.tell() * 100 // size, f'Imported {imported} movements, {failed} rows rejected')
+
+        result = import_movements(iter_records(stream, fmt), chunk_size=chunk_size, on_chunk=on_chunk)
+
+    if result['errors']:
+        with open(result_path(job, 'import-errors.csv'), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(('line', 'error'))
+            writer.writerows((error['line'], error['error']) for error in result['errors'])
+        _update_job(job.id, result_name='import-errors.csv')
+    os.remove(path)
+    return {'imported': result['imported'], 'failed': result['failed'],
+            'errors': result['errors'][:MAX_RESULT_ERRORS]}
+
+@job_type('rebuild_balances')
+def rebuild_balances_job(job):
+    job_progress(job, 10, 'Recomputing balances from the ledger')
+    return {'balances': rebuild_stock_balances()}
@@ -0,0 +1,46 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('location',
+    sa.Column('location_id', sa.String(length=50), nullable=False),
+    sa.PrimaryKeyConstraint('location_id')
+    )
+    op.create_table('product',
+    sa.Column('product_id', sa.String(length=50), nullable=False),
+    sa.Column('product_name', sa.String(length=100), nullable=True),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_table('product_movement',
+    sa.Column('movement_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column('from_location', sa.String(length=50), nullable=True),
+    sa.Column('to_location', sa.String(length=50), nullable=True),
+    sa.Column('product_id', sa.String(length=50), nullable=False),
+    sa.Column('qty', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['from_location'], ['location.location_id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.product_id'], ),
+    sa.ForeignKeyConstraint(['to_location'], ['location.location_id'], ),
+    sa.PrimaryKeyConstraint('movement_id')
+    )
+
+
+def downgrade():
+    op.drop_table('product_movement')
+    op.drop_table('product')
+    op.drop_table('location')
@@ -0,0 +1,66 @@
+"""stock balance, data version and checkpoint tables
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created with db.create_all() may already have some of these tables
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'stock_balance' not in existing:
+        op.create_table('stock_balance',
+        sa.Column('product_id', sa.String(length=50), nullable=False),
+        sa.Column('location_id', sa.String(length=50), nullable=False),
+        sa.Column('on_hand', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['location_id'], ['location.location_id'], ),
+        sa.ForeignKeyConstraint(['product_id'], ['product.product_id'], ),
+        sa.PrimaryKeyConstraint('product_id', 'location_id')
+        )
+    if 'data_version' not in existing:
+        op.create_table('data_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'stock_checkpoint' not in existing:
+        op.create_table('stock_checkpoint',
+        sa.Column('taken_at', sa.DateTime(), nullable=False),
+        sa.Column('product_id', sa.String(length=50), nullable=False),
+        sa.Column('location_id', sa.String(length=50), nullable=False),
+        sa.Column('qty_in', sa.Integer(), nullable=False),
+        sa.Column('qty_out', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['location_id'], ['location.location_id'], ),
+        sa.ForeignKeyConstraint(['product_id'], ['product.product_id'], ),
+        sa.PrimaryKeyConstraint('taken_at', 'product_id', 'location_id')
+        )
+
+    # Backfill balances from the existing ledger in one grouped statement
+    if op.get_bind().execute(sa.text('SELECT COUNT(*) FROM stock_balance')).scalar() == 0:
+        op.execute(
+            'INSERT INTO stock_balance (product_id, location_id, on_hand, version) '
+            'SELECT product_id, location_id, SUM(qty), 1 FROM ('
+            ' SELECT product_id, to_location AS location_id, qty FROM product_movement WHERE to_location IS NOT NULL'
+            ' UNION ALL'
+            ' SELECT product_id, from_location AS location_id, -qty FROM product_movement WHERE from_location IS NOT NULL'
+            ') AS signed GROUP BY product_id, location_id'
+        )
+
+
+def downgrade():
+    op.drop_table('stock_checkpoint')
+    op.drop_table('data_version')
+    op.drop_table('stock_balance')
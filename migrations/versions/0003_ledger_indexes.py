@@ -0,0 +1,38 @@
+"""composite indexes on the movement ledger
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_product_movement_timestamp_id', ['timestamp', 'movement_id']),
+    ('ix_product_movement_product_timestamp', ['product_id', 'timestamp', 'movement_id']),
+    ('ix_product_movement_from_timestamp', ['from_location', 'timestamp', 'movement_id']),
+    ('ix_product_movement_to_timestamp', ['to_location', 'timestamp', 'movement_id']),
+    ('ix_product_movement_product_to', ['product_id', 'to_location', 'qty']),
+    ('ix_product_movement_product_from', ['product_id', 'from_location', 'qty']),
+]
+
+
+def upgrade():
+    # Some indexes may already exist on databases that created them at startup
+    existing = {index['name'] for index in sa.inspect(op.get_bind()).get_indexes('product_movement')}
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'product_movement', columns, unique=False)
+
+
+def downgrade():
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='product_movement')
@@ -0,0 +1,67 @@
+"""product search index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # FTS5 trigram index kept in step with product by triggers; it shares
+        # product's rowid. Builds without FTS5 trigram use the Python fallback.
+        try:
+            op.execute("CREATE VIRTUAL TABLE product_search USING fts5(product_id, product_name, tokenize='trigram')")
+        except sa.exc.OperationalError:
+            return
+        op.execute(
+            "INSERT INTO product_search (rowid, product_id, product_name) "
+            "SELECT rowid, product_id, COALESCE(product_name, '') FROM product"
+        )
+        op.execute(
+            "CREATE TRIGGER product_search_ai AFTER INSERT ON product BEGIN "
+            "INSERT INTO product_search (rowid, product_id, product_name) "
+            "VALUES (new.rowid, new.product_id, COALESCE(new.product_name, '')); END"
+        )
+        op.execute(
+            "CREATE TRIGGER product_search_ad AFTER DELETE ON product BEGIN "
+            "DELETE FROM product_search WHERE rowid = old.rowid; END"
+        )
+        op.execute(
+            "CREATE TRIGGER product_search_au AFTER UPDATE ON product BEGIN "
+            "DELETE FROM product_search WHERE rowid = old.rowid; "
+            "INSERT INTO product_search (rowid, product_id, product_name) "
+            "VALUES (new.rowid, new.product_id, COALESCE(new.product_name, '')); END"
+        )
+    elif bind.dialect.name == 'postgresql':
+        # pg_trgm may need a superuser; without it search falls back to Python
+        try:
+            with bind.begin_nested():
+                bind.execute(sa.text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        except sa.exc.DBAPIError:
+            return
+        op.execute('CREATE INDEX ix_product_id_trgm ON product USING gin (product_id gin_trgm_ops)')
+        op.execute('CREATE INDEX ix_product_name_trgm ON product USING gin (product_name gin_trgm_ops)')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS product_search_au')
+        op.execute('DROP TRIGGER IF EXISTS product_search_ad')
+        op.execute('DROP TRIGGER IF EXISTS product_search_ai')
+        op.execute('DROP TABLE IF EXISTS product_search')
+    elif bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_product_name_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_product_id_trgm')
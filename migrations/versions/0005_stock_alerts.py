@@ -0,0 +1,52 @@
+"""reorder thresholds and open low-stock alerts
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Matches the DEFAULT_REORDER_POINT default; `flask rebuild-alerts` applies another setting
+DEFAULT_REORDER_POINT = 10
+
+
+def upgrade():
+    op.create_table('reorder_threshold',
+    sa.Column('product_id', sa.String(length=50), nullable=False),
+    sa.Column('location_id', sa.String(length=50), nullable=False),
+    sa.Column('reorder_point', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['location_id'], ['location.location_id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.product_id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'location_id')
+    )
+    op.create_table('stock_alert',
+    sa.Column('product_id', sa.String(length=50), nullable=False),
+    sa.Column('location_id', sa.String(length=50), nullable=False),
+    sa.Column('on_hand', sa.Integer(), nullable=False),
+    sa.Column('reorder_point', sa.Integer(), nullable=False),
+    sa.Column('opened_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['location_id'], ['location.location_id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.product_id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'location_id')
+    )
+
+    # Open the alerts of the current balances
+    op.get_bind().execute(sa.text(
+        'INSERT INTO stock_alert (product_id, location_id, on_hand, reorder_point, opened_at) '
+        'SELECT product_id, location_id, on_hand, :reorder_point, CURRENT_TIMESTAMP FROM stock_balance '
+        'WHERE on_hand <= :reorder_point'
+    ), {'reorder_point': DEFAULT_REORDER_POINT})
+
+
+def downgrade():
+    op.drop_table('stock_alert')
+    op.drop_table('reorder_threshold')
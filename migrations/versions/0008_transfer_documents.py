@@ -0,0 +1,41 @@
+"""multi-line transfer documents
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('transfer_document',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('reference', sa.String(length=50), nullable=True),
+    sa.Column('from_location', sa.String(length=50), nullable=True),
+    sa.Column('to_location', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['from_location'], ['location.location_id'], ),
+    sa.ForeignKeyConstraint(['to_location'], ['location.location_id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('product_movement', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('document_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_product_movement_document_id', 'transfer_document', ['document_id'], ['id'])
+        batch_op.create_index('ix_product_movement_document', ['document_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('product_movement', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_movement_document')
+        batch_op.drop_constraint('fk_product_movement_document_id', type_='foreignkey')
+        batch_op.drop_column('document_id')
+    op.drop_table('transfer_document')
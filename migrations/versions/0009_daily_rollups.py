@@ -0,0 +1,48 @@
+"""daily movement rollups
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_movement_rollup',
+    sa.Column('product_id', sa.String(length=50), nullable=False),
+    sa.Column('location_id', sa.String(length=50), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('qty_in', sa.Integer(), nullable=False),
+    sa.Column('qty_out', sa.Integer(), nullable=False),
+    sa.Column('movement_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['location_id'], ['location.location_id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.product_id'], ),
+    sa.PrimaryKeyConstraint('product_id', 'location_id', 'day')
+    )
+    op.create_index('ix_daily_movement_rollup_day', 'daily_movement_rollup', ['day'], unique=False)
+
+    # Backfill from the existing ledger; each side of a transfer counts at its own location
+    op.execute(
+        'INSERT INTO daily_movement_rollup (product_id, location_id, day, qty_in, qty_out, movement_count) '
+        'SELECT product_id, location_id, day, SUM(qty_in), SUM(qty_out), COUNT(*) FROM ('
+        ' SELECT product_id, to_location AS location_id, DATE("timestamp") AS day, qty AS qty_in, 0 AS qty_out'
+        ' FROM product_movement WHERE to_location IS NOT NULL'
+        ' UNION ALL'
+        ' SELECT product_id, from_location AS location_id, DATE("timestamp") AS day, 0 AS qty_in, qty AS qty_out'
+        ' FROM product_movement WHERE from_location IS NOT NULL'
+        ') AS movements GROUP BY product_id, location_id, day'
+    )
+
+
+def downgrade():
+    op.drop_index('ix_daily_movement_rollup_day', table_name='daily_movement_rollup')
+    op.drop_table('daily_movement_rollup')
@@ -0,0 +1,277 @@
+"""integer surrogate keys for products and locations
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+# Every table that stores a product or location reference, parents first
+TABLES = ('product', 'location', 'transfer_document', 'product_movement', 'stock_balance',
+          'daily_movement_rollup', 'stock_checkpoint', 'reorder_threshold', 'stock_alert')
+# Tables keyed by one (product, location) pair, with their remaining columns
+PAIR_TABLES = {
+    'stock_balance': ('on_hand', 'version'),
+    'daily_movement_rollup': ('day', 'qty_in', 'qty_out', 'movement_count'),
+    'stock_checkpoint': ('taken_at', 'qty_in', 'qty_out'),
+    'reorder_threshold': ('reorder_point',),
+    'stock_alert': ('on_hand', 'reorder_point', 'opened_at'),
+}
+MOVEMENT_INDEXES = {
+    'ix_product_movement_timestamp_id': ('timestamp', 'movement_id'),
+    'ix_product_movement_product_timestamp': ('product', 'timestamp', 'movement_id'),
+    'ix_product_movement_from_timestamp': ('from_location', 'timestamp', 'movement_id'),
+    'ix_product_movement_to_timestamp': ('to_location', 'timestamp', 'movement_id'),
+    'ix_product_movement_product_to': ('product', 'to_location', 'qty'),
+    'ix_product_movement_product_from': ('product', 'from_location', 'qty'),
+    'ix_product_movement_document': ('document_id',),
+}
+# Tables are rebuilt under this suffix, then renamed into place
+SUFFIX = '_rekeyed'
+
+
+def _create_tables(keyed):
+    # keyed=True builds the integer surrogate key schema, False the string id schema
+    ref = sa.Integer() if keyed else sa.String(length=50)
+    product_ref = 'id' if keyed else 'product_id'
+    location_ref = 'id' if keyed else 'location_id'
+    product_column = 'product_key' if keyed else 'product_id'
+    location_column = 'location_key' if keyed else 'location_id'
+    from_column = 'from_location_key' if keyed else 'from_location'
+    to_column = 'to_location_key' if keyed else 'to_location'
+    product = 'product' + SUFFIX
+    location = 'location' + SUFFIX
+
+    if keyed:
+        op.create_table(product,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('product_id', sa.String(length=50), nullable=False),
+        sa.Column('product_name', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('product_id')
+        )
+        op.create_table(location,
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('location_id', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('location_id')
+        )
+    else:
+        op.create_table(product,
+        sa.Column('product_id', sa.String(length=50), nullable=False),
+        sa.Column('product_name', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('product_id')
+        )
+        op.create_table(location,
+        sa.Column('location_id', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('location_id')
+        )
+
+    op.create_table('transfer_document' + SUFFIX,
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('reference', sa.String(length=50), nullable=True),
+    sa.Column(from_column, ref, nullable=True),
+    sa.Column(to_column, ref, nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint([from_column], [f'{location}.{location_ref}'], ),
+    sa.ForeignKeyConstraint([to_column], [f'{location}.{location_ref}'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('product_movement' + SUFFIX,
+    sa.Column('movement_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.Column(from_column, ref, nullable=True),
+    sa.Column(to_column, ref, nullable=True),
+    sa.Column(product_column, ref, nullable=False),
+    sa.Column('qty', sa.Integer(), nullable=False),
+    sa.Column('document_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint([from_column], [f'{location}.{location_ref}'], ),
+    sa.ForeignKeyConstraint([to_column], [f'{location}.{location_ref}'], ),
+    sa.ForeignKeyConstraint([product_column], [f'{product}.{product_ref}'], ),
+    sa.ForeignKeyConstraint(['document_id'], [f'transfer_document{SUFFIX}.id'],
+                            name='fk_product_movement_document_id'),
+    sa.PrimaryKeyConstraint('movement_id')
+    )
+
+    extra_columns = {
+        'on_hand': sa.Integer(), 'version': sa.Integer(), 'day': sa.Date(), 'qty_in': sa.Integer(),
+        'qty_out': sa.Integer(), 'movement_count': sa.Integer(), 'taken_at': sa.DateTime(),
+        'reorder_point': sa.Integer(), 'opened_at': sa.DateTime(),
+    }
+    for table, columns in PAIR_TABLES.items():
+        # stock_checkpoint leads its primary key with taken_at; the others end it with day, if any
+        leading = [name for name in columns if name == 'taken_at']
+        trailing = [name for name in columns if name == 'day']
+        op.create_table(table + SUFFIX,
+        *[sa.Column(name, extra_columns[name], nullable=False) for name in leading],
+        sa.Column(product_column, ref, nullable=False),
+        sa.Column(location_column, ref, nullable=False),
+        *[sa.Column(name, extra_columns[name], nullable=False) for name in columns if name != 'taken_at'],
+        sa.ForeignKeyConstraint([location_column], [f'{location}.{location_ref}'], ),
+        sa.ForeignKeyConstraint([product_column], [f'{product}.{product_ref}'], ),
+        sa.PrimaryKeyConstraint(*leading, product_column, location_column, *trailing)
+        )
+
+
+# Copy every row into the rebuilt tables. Each reference is translated by joining
+# it to a product or location table that holds both the id and the key: the rebuilt
+# one when adding keys, the old one when taking them out again.
+def _copy_tables(keyed):
+    product = 'product' + SUFFIX
+    location = 'location' + SUFFIX
+    if keyed:
+        # Keys are handed out in id order, so key order starts out matching id order
+        op.execute(f'INSERT INTO {product} (product_id, product_name) '
+                   'SELECT product_id, product_name FROM product ORDER BY product_id')
+        op.execute(f'INSERT INTO {location} (location_id) SELECT location_id FROM location ORDER BY location_id')
+        # (table joined, its column matching the old value, its column holding the new value)
+        products = (product, 'product_id', 'id')
+        locations = (location, 'location_id', 'id')
+        columns = {'product_id': 'product_key', 'location_id': 'location_key',
+                   'from_location': 'from_location_key', 'to_location': 'to_location_key'}
+    else:
+        op.execute(f'INSERT INTO {product} (product_id, product_name) SELECT product_id, product_name FROM product')
+        op.execute(f'INSERT INTO {location} (location_id) SELECT location_id FROM location')
+        products = ('product', 'id', 'product_id')
+        locations = ('location', 'id', 'location_id')
+        columns = {'product_key': 'product_id', 'location_key': 'location_id',
+                   'from_location_key': 'from_location', 'to_location_key': 'to_location'}
+    product_old, location_old, from_old, to_old = columns
+    product_new, location_new, from_new, to_new = columns.values()
+
+    def join(alias, lookup, old_column, outer=False):
+        table, matched, _ = lookup
+        return f'{"LEFT JOIN" if outer else "JOIN"} {table} {alias} ON {alias}.{matched} = t.{old_column} '
+
+    def value(alias, lookup):
+        return f'{alias}.{lookup[2]}'
+
+    op.execute(
+        f'INSERT INTO transfer_document{SUFFIX} (id, reference, {from_new}, {to_new}, created_at) '
+        f'SELECT t.id, t.reference, {value("f", locations)}, {value("d", locations)}, t.created_at '
+        'FROM transfer_document t '
+        + join('f', locations, from_old, outer=True) + join('d', locations, to_old, outer=True)
+    )
+    op.execute(
+        f'INSERT INTO product_movement{SUFFIX} '
+        f'(movement_id, "timestamp", {from_new}, {to_new}, {product_new}, qty, document_id) '
+        f'SELECT t.movement_id, t."timestamp", {value("f", locations)}, {value("d", locations)}, '
+        f'{value("p", products)}, t.qty, t.document_id FROM product_movement t '
+        + join('p', products, product_old)
+        + join('f', locations, from_old, outer=True) + join('d', locations, to_old, outer=True)
+    )
+    for table, extra in PAIR_TABLES.items():
+        op.execute(
+            f'INSERT INTO {table}{SUFFIX} ({product_new}, {location_new}, {", ".join(extra)}) '
+            f'SELECT {value("p", products)}, {value("l", locations)}, {", ".join("t." + name for name in extra)} '
+            f'FROM {table} t ' + join('p', products, product_old) + join('l', locations, location_old)
+        )
+
+
+def _create_indexes(keyed):
+    product_column = 'product_key' if keyed else 'product_id'
+    from_column = 'from_location_key' if keyed else 'from_location'
+    to_column = 'to_location_key' if keyed else 'to_location'
+    columns = {'product': product_column, 'from_location': from_column, 'to_location': to_column}
+    for name, parts in MOVEMENT_INDEXES.items():
+        op.create_index(name, 'product_movement', [columns.get(part, part) for part in parts], unique=False)
+    op.create_index('ix_daily_movement_rollup_day', 'daily_movement_rollup', ['day'], unique=False)
+
+
+def _drop_search(bind):
+    if bind.dialect.name == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS product_search_au')
+        op.execute('DROP TRIGGER IF EXISTS product_search_ad')
+        op.execute('DROP TRIGGER IF EXISTS product_search_ai')
+    elif bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_product_name_trgm')
+        op.execute('DROP INDEX IF EXISTS ix_product_id_trgm')
+
+
+# Recreate the search index of 0004 on the rebuilt product table
+def _create_search(bind, had_fts):
+    if bind.dialect.name == 'sqlite' and had_fts:
+        op.execute('DELETE FROM product_search')
+        op.execute(
+            "INSERT INTO product_search (rowid, product_id, product_name) "
+            "SELECT rowid, product_id, COALESCE(product_name, '') FROM product"
+        )
+        op.execute(
+            "CREATE TRIGGER product_search_ai AFTER INSERT ON product BEGIN "
+            "INSERT INTO product_search (rowid, product_id, product_name) "
+            "VALUES (new.rowid, new.product_id, COALESCE(new.product_name, '')); END"
+        )
+        op.execute(
+            "CREATE TRIGGER product_search_ad AFTER DELETE ON product BEGIN "
+            "DELETE FROM product_search WHERE rowid = old.rowid; END"
+        )
+        op.execute(
+            "CREATE TRIGGER product_search_au AFTER UPDATE ON product BEGIN "
+            "DELETE FROM product_search WHERE rowid = old.rowid; "
+            "INSERT INTO product_search (rowid, product_id, product_name) "
+            "VALUES (new.rowid, new.product_id, COALESCE(new.product_name, '')); END"
+        )
+    elif bind.dialect.name == 'postgresql' and bind.execute(
+            sa.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first():
+        op.execute('CREATE INDEX ix_product_id_trgm ON product USING gin (product_id gin_trgm_ops)')
+        op.execute('CREATE INDEX ix_product_name_trgm ON product USING gin (product_name gin_trgm_ops)')
+
+
+# PostgreSQL keeps the names the rebuilt tables were created under for their
+# constraints and sequences: restore the usual ones, and move the sequences past
+# the ids that were copied in explicitly
+def _tidy_postgresql_names(bind):
+    for table in TABLES:
+        for (name,) in bind.execute(sa.text('SELECT conname FROM pg_constraint WHERE conrelid = CAST(:t AS regclass)'),
+                                    {'t': table}):
+            if name.startswith(table + SUFFIX):
+                op.execute(f'ALTER TABLE {table} RENAME CONSTRAINT {name} TO {table}{name[len(table + SUFFIX):]}')
+        columns = {column['name'] for column in sa.inspect(bind).get_columns(table)}
+        for column in ('id', 'movement_id'):
+            if column not in columns:
+                continue
+            sequence = bind.execute(sa.text('SELECT pg_get_serial_sequence(:t, :c)'), {'t': table, 'c': column}).scalar()
+            if sequence is None:
+                continue
+            op.execute(f"SELECT setval('{sequence}', COALESCE((SELECT MAX({column}) FROM {table}), 0) + 1, false)")
+            op.execute(f'ALTER SEQUENCE {sequence} RENAME TO {table}_{column}_seq')
+
+
+def _rebuild(keyed):
+    bind = op.get_bind()
+    had_fts = sa.inspect(bind).has_table('product_search')
+    _drop_search(bind)
+    for name in MOVEMENT_INDEXES:
+        op.drop_index(name, table_name='product_movement')
+    op.drop_index('ix_daily_movement_rollup_day', table_name='daily_movement_rollup')
+
+    _create_tables(keyed)
+    _copy_tables(keyed)
+    for table in reversed(TABLES):
+        op.drop_table(table)
+    # SQLite rewrites the foreign keys of the other rebuilt tables on each rename;
+    # PostgreSQL tracks them by table identity
+    for table in TABLES:
+        op.rename_table(table + SUFFIX, table)
+    _create_indexes(keyed)
+
+    if bind.dialect.name == 'postgresql':
+        _tidy_postgresql_names(bind)
+    _create_search(bind, had_fts)
+
+
+def upgrade():
+    _rebuild(keyed=True)
+
+
+def downgrade():
+    _rebuild(keyed=False)
@@ -5,14 +5,19 @@ from datetime import datetime
 db = SQLAlchemy()
 
 class Product(db.Model):
-    product_id = db.Column(db.String(50), primary_key=True)
+    # Compact surrogate key referenced by every other table; product_id is the
+    # human SKU, so renaming a product only rewrites this row
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.String(50), nullable=False, unique=True)
     product_name = db.Column(db.String(100), nullable=True)
     
     def __repr__(self):
         return f'<Product {self.product_id}>'
 
 class Location(db.Model):
-    location_id = db.Column(db.String(50), primary_key=True)
+    # Surrogate key as for Product; location_id is the human location code
+    id = db.Column(db.Integer, primary_key=True)
+    location_id = db.Column(db.String(50), nullable=False, unique=True)
     
     def __repr__(self):
         return f'<Location {self.location_id}>'
@@ -20,15 +25,166 @@ class Location(db.Model):
 class ProductMovement(db.Model):
     movement_id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.now, nullable=False)
-    from_location = db.Column(db.String(50), db.ForeignKey('location.location_id'), nullable=True)
-    to_location = db.Column(db.String(50), db.ForeignKey('location.location_id'), nullable=True)
-    product_id = db.Column(db.String(50), db.ForeignKey('product.product_id'), nullable=False)
+    from_location_key = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=True)
+    to_location_key = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=True)
+    product_key = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     qty = db.Column(db.Integer, nullable=False)
+    # Transfer document this movement is a line of, if any
+    document_id = db.Column(db.Integer, db.ForeignKey('transfer_document.id'), nullable=True)
     
     # Define relationships
     product = db.relationship('Product', backref='movements')
-    source = db.relationship('Location', foreign_keys=[from_location], backref='outgoing_movements')
-    destination = db.relationship('Location', foreign_keys=[to_location], backref='incoming_movements')
+    source = db.relationship('Location', foreign_keys=[from_location_key], backref='outgoing_movements')
+    destination = db.relationship('Location', foreign_keys=[to_location_key], backref='incoming_movements')
+    
+    # Composite indexes backing the keyset-paginated, filtered movement listing
+    # and the per-(product, location) incoming/outgoing aggregates. qty is
+    # included so the SUMs are answered from the index alone.
+    __table_args__ = (
+        db.Index('ix_product_movement_timestamp_id', 'timestamp', 'movement_id'),
+        db.Index('ix_product_movement_product_timestamp', 'product_key', 'timestamp', 'movement_id'),
+        db.Index('ix_product_movement_from_timestamp', 'from_location_key', 'timestamp', 'movement_id'),
+        db.Index('ix_product_movement_to_timestamp', 'to_location_key', 'timestamp', 'movement_id'),
+        db.Index('ix_product_movement_product_to', 'product_key', 'to_location_key', 'qty'),
+        db.Index('ix_product_movement_product_from', 'product_key', 'from_location_key', 'qty'),
+        db.Index('ix_product_movement_document', 'document_id'),
+    )
+    
+    def __repr__(self):
+        return f'<ProductMovement {self.movement_id}>'
+
+class TransferDocument(db.Model):
+    # Multi-line movement order: every line is a ProductMovement with this
+    # document_id, all booked against the balances in one transaction
+    id = db.Column(db.Integer, primary_key=True)
+    reference = db.Column(db.String(50), nullable=True)
+    from_location_key = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=True)
+    to_location_key = db.Column(db.Integer, db.ForeignKey('location.id'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    
+    lines = db.relationship('ProductMovement', backref='document', order_by='ProductMovement.movement_id')
+    source = db.relationship('Location', foreign_keys=[from_location_key])
+    destination = db.relationship('Location', foreign_keys=[to_location_key])
+    
+    def __repr__(self):
+        return f'<TransferDocument {self.id}>'
+
+class StockBalance(db.Model):
+    # Materialized on-hand quantity per (product, location), kept in step with
+    # the movement ledger inside the same transaction as every movement write
+    product_key = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    location_key = db.Column(db.Integer, db.ForeignKey('location.id'), primary_key=True)
+    on_hand = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    product = db.relationship('Product')
+    location = db.relationship('Location')
+    
+    def __repr__(self):
+        return f'<StockBalance {self.product_key}@{self.location_key}: {self.on_hand}>'
+
+class DailyMovementRollup(db.Model):
+    # Movement totals per product, location and day, maintained in the same
+    # transaction as every movement write so analytics never scan the ledger
+    product_key = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    location_key = db.Column(db.Integer, db.ForeignKey('location.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    qty_in = db.Column(db.Integer, nullable=False, default=0)
+    qty_out = db.Column(db.Integer, nullable=False, default=0)
+    movement_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Range scans over all products and locations for a period
+    __table_args__ = (
+        db.Index('ix_daily_movement_rollup_day', 'day'),
+    )
+    
+    def __repr__(self):
+        return f'<DailyMovementRollup {self.product_key}@{self.location_key} {self.day}>'
+
+class DataVersion(db.Model):
+    # Single-row counter bumped in the same transaction as every data write,
+    # used as the high-water mark for ETags and caches
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.version}>'
+
+class StockCheckpoint(db.Model):
+    # Cumulative incoming/outgoing totals per (product, location) for all movements
+    # timestamped at or before taken_at; point-in-time reports replay only what follows
+    taken_at = db.Column(db.DateTime, primary_key=True)
+    product_key = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    location_key = db.Column(db.Integer, db.ForeignKey('location.id'), primary_key=True)
+    qty_in = db.Column(db.Integer, nullable=False, default=0)
+    qty_out = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StockCheckpoint {self.taken_at} {self.product_key}@{self.location_key}>'
+
+class ReorderThreshold(db.Model):
+    # Reorder point for one product at one location; pairs without a row use
+    # the DEFAULT_REORDER_POINT setting
+    product_key = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    location_key = db.Column(db.Integer, db.ForeignKey('location.id'), primary_key=True)
+    reorder_point = db.Column(db.Integer, nullable=False)
+    
+    product = db.relationship('Product')
+    location = db.relationship('Location')
+    
+    def __repr__(self):
+        return f'<ReorderThreshold {self.product_key}@{self.location_key}: {self.reorder_point}>'
+
+class StockAlert(db.Model):
+    # Open low-stock alert: one row per (product, location) whose on-hand quantity
+    # is at or below its reorder point, kept current by the alert evaluator
+    product_key = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    location_key = db.Column(db.Integer, db.ForeignKey('location.id'), primary_key=True)
+    on_hand = db.Column(db.Integer, nullable=False)
+    reorder_point = db.Column(db.Integer, nullable=False)
+    opened_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    
+    product = db.relationship('Product')
+    location = db.relationship('Location')
+    
+    def __repr__(self):
+        return f'<StockAlert {self.product_key}@{self.location_key}: {self.on_hand} <= {self.reorder_point}>'
+
+class EventLog(db.Model):
+    # Committed change events for the live feed. Each worker polls this table to fan
+    # events out to its own SSE clients; rows older than EVENTS_RETENTION are pruned.
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    kind = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    
+    # Never reuse ids on SQLite, even after pruning every row: pollers track the last id seen
+    __table_args__ = {'sqlite_autoincrement': True}
+    
+    def __repr__(self):
+        return f'<EventLog {self.id} {self.kind}>'
+
+class Job(db.Model):
+    # Background job queued by the web app and run by `flask worker`. Workers claim
+    # a queued row with a conditional UPDATE, so each job runs exactly once.
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    params = db.Column(db.Text, nullable=False, default='{}')
+    status = db.Column(db.String(10), nullable=False, default='queued')
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(200), nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    result_name = db.Column(db.String(100), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    worker = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
     
     def __repr__(self):
-        return f'<ProductMovement {self.movement_id}>'
\ No newline at end of file
+        return f'<Job {self.id} {self.kind} {self.status}>'
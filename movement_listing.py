@@ -0,0 +1,104 @@
+import base64
+from datetime import datetime, timedelta
+
+from sqlalchemy import false, tuple_
+from sqlalchemy.orm import joinedload
+
+from models import ProductMovement
+from reference_data import reference_data
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+DIRECTIONS = ('in', 'out', 'transfer')
+
+# Read the movement filters from request args. Unknown or malformed values are
+# dropped and reported back in `errors` so the page can warn about them.
+def parse_movement_filters(args):
+    filters = {
+        'product_id': (args.get('product_id') or '').strip() or None,
+        'location_id': (args.get('location_id') or '').strip() or None,
+        'direction': args.get('direction') if args.get('direction') in DIRECTIONS else None,
+        'date_from': None,
+        'date_to': None,
+    }
+    errors = []
+    for key in ('date_from', 'date_to'):
+        value = (args.get(key) or '').strip()
+        if not value:
+            continue
+        try:
+            filters[key] = datetime.strptime(value, '%Y-%m-%d')
+        except ValueError:
+            errors.append(f'Ignoring invalid date "{value}" (expected YYYY-MM-DD).')
+    return filters, errors
+
+# Apply the filters in SQL. Ids are resolved to surrogate keys up front; an id
+# that does not exist matches no movements.
+def filter_movements(query, filters):
+    if filters['product_id']:
+        product_key = reference_data.key('products', filters['product_id'])
+        if product_key is None:
+            return query.filter(false())
+        query = query.filter(ProductMovement.product_key == product_key)
+    if filters['location_id']:
+        location_key = reference_data.key('locations', filters['location_id'])
+        if location_key is None:
+            return query.filter(false())
+        query = query.filter(
+            (ProductMovement.from_location_key == location_key) |
+            (ProductMovement.to_location_key == location_key)
+        )
+    if filters['direction'] == 'in':
+        query = query.filter(ProductMovement.from_location_key.is_(None))
+    elif filters['direction'] == 'out':
+        query = query.filter(ProductMovement.to_location_key.is_(None))
+    elif filters['direction'] == 'transfer':
+        query = query.filter(ProductMovement.from_location_key.isnot(None), ProductMovement.to_location_key.isnot(None))
+    if filters['date_from']:
+        query = query.filter(ProductMovement.timestamp >= filters['date_from'])
+    if filters['date_to']:
+        # The end date is inclusive
+        query = query.filter(ProductMovement.timestamp < filters['date_to'] + timedelta(days=1))
+    return query
+
+# Cursors are an opaque encoding of the (timestamp, movement_id) of the last row shown
+def encode_cursor(movement):
+    raw = f'{movement.timestamp.isoformat()}|{movement.movement_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, movement_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(movement_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def parse_page_size(value):
+    try:
+        return max(1, min(MAX_PAGE_SIZE, int(value)))
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+
+# One page of movements, newest first, seeking past `cursor` on the
+# (timestamp, movement_id) index instead of using OFFSET.
+# Returns (movements, next_cursor); next_cursor is None on the last page.
+def paginate_movements(filters, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    query = filter_movements(ProductMovement.query, filters).options(
+        joinedload(ProductMovement.product),
+        joinedload(ProductMovement.source),
+        joinedload(ProductMovement.destination)
+    )
+
+    position = decode_cursor(cursor)
+    if position:
+        query = query.filter(tuple_(ProductMovement.timestamp, ProductMovement.movement_id) < position)
+
+    rows = query.order_by(
+        ProductMovement.timestamp.desc(), ProductMovement.movement_id.desc()
+    ).limit(per_page + 1).all()
+
+    next_cursor = encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
@@ -0,0 +1,105 @@
+import threading
+from bisect import bisect_right
+
+from models import db, Product, Location
+from versioning import current_catalog_version
+
+# Catalogs up to this size are rendered into plain <select>s; larger ones get a
+# lookup widget that pages through /api/lookup/<kind> as the user types
+INLINE_CHOICES_LIMIT = 200
+LOOKUP_PAGE_SIZE = 20
+MAX_LOOKUP_PAGE_SIZE = 100
+LOOKUP_KINDS = ('products', 'locations')
+
+# Sorted (id, label) pairs of one catalog, with lowercase search terms built once
+# and the mapping between human ids and integer surrogate keys both ways. Sorted in
+# Python rather than by the database, whose collation may order strings differently
+# from the comparisons `lookup` pages with.
+class Catalog:
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: row[1])
+        self.choices = [(id_, label or id_) for _, id_, label in rows]
+        self.ids = [id_ for id_, _ in self.choices]
+        self.terms = [f'{id_} {label}'.lower() for id_, label in self.choices]
+        self.id_set = frozenset(self.ids)
+        self.key_by_id = {id_: key for key, id_, _ in rows}
+        self.id_by_key = {key: id_ for key, id_, _ in rows}
+
+    def __len__(self):
+        return len(self.ids)
+
+    # One page of entries whose id or label contains `query`, after the id `after`.
+    # Returns (entries, next_after); next_after is None on the last page.
+    def lookup(self, query='', after=None, limit=LOOKUP_PAGE_SIZE):
+        query = query.strip().lower()
+        start = bisect_right(self.ids, after) if after else 0
+        page = []
+        for index in range(start, len(self.ids)):
+            if query in self.terms[index]:
+                if len(page) == limit:
+                    return page, page[-1][0]
+                page.append(self.choices[index])
+        return page, None
+
+# Products and locations for forms and lookups, held per worker as plain tuples
+# and reloaded only when the catalog version moves, so movement writes never
+# invalidate it and no request loads the catalog as ORM objects. Requests check the
+# version and rebuild without holding the lock; it only guards swapping in a build.
+class ReferenceData:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (catalog version, catalogs), replaced as a whole
+        self._cached = None
+
+    def catalogs(self):
+        version = current_catalog_version()
+        cached = self._cached
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        catalogs = {
+            'products': Catalog(db.session.query(Product.id, Product.product_id, Product.product_name)),
+            'locations': Catalog(db.session.query(Location.id, Location.location_id, Location.location_id)),
+        }
+        with self._lock:
+            # A concurrent request may have stored a build of a newer version meanwhile
+            if self._cached is None or self._cached[0] <= version:
+                self._cached = (version, catalogs)
+        return catalogs
+
+    def catalog(self, kind):
+        return self.catalogs()[kind]
+
+    # The (id, label) choices of `kind` for a <select>, or None when the catalog
+    # is too large and the form should use the lookup widget instead
+    def choices(self, kind):
+        catalog = self.catalog(kind)
+        return catalog.choices if len(catalog) <= INLINE_CHOICES_LIMIT else None
+
+    def exists(self, kind, id_):
+        return id_ in self.catalog(kind).id_set
+
+    # Surrogate key of a product or location id, or None when it does not exist
+    def key(self, kind, id_):
+        return self.catalog(kind).key_by_id.get(id_)
+
+    # Human id of a surrogate key; keys of rows deleted since the catalog was
+    # loaded come back as None
+    def id_of(self, kind, key):
+        return self.catalog(kind).id_by_key.get(key)
+
+    def lookup(self, kind, query='', after=None, limit=LOOKUP_PAGE_SIZE):
+        return self.catalog(kind).lookup(query, after, max(1, min(MAX_LOOKUP_PAGE_SIZE, limit)))
+
+    # Error message for a submitted product or location that does not exist
+    def unknown_reference(self, product_id, *location_ids):
+        catalogs = self.catalogs()
+        if product_id not in catalogs['products'].id_set:
+            return f'Unknown product "{product_id}".'
+        for location_id in location_ids:
+            if location_id and location_id not in catalogs['locations'].id_set:
+                return f'Unknown location "{location_id}".'
+        return None
+
+# Shared instance
+reference_data = ReferenceData()
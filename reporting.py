@@ -0,0 +1,79 @@
+from sqlalchemy import func
+
+from models import db, Product, Location, ProductMovement
+
+# Restrict a ledger query to movements in the window (after, until]
+def _window(query, after=None, until=None):
+    if after is not None:
+        query = query.filter(ProductMovement.timestamp > after)
+    if until is not None:
+        query = query.filter(ProductMovement.timestamp <= until)
+    return query
+
+# Incoming and outgoing totals for every (product, location) pair that has movements,
+# keyed by surrogate keys and computed in two grouped queries instead of two SUMs per pair.
+# `after`/`until` limit the totals to movements timestamped in (after, until].
+def ledger_totals(after=None, until=None):
+    totals = {}
+
+    incoming = _window(db.session.query(
+        ProductMovement.product_key,
+        ProductMovement.to_location_key,
+        func.sum(ProductMovement.qty)
+    ).filter(ProductMovement.to_location_key.isnot(None)), after, until).group_by(
+        ProductMovement.product_key, ProductMovement.to_location_key
+    )
+    for product_key, location_key, qty in incoming:
+        totals[(product_key, location_key)] = [qty or 0, 0]
+
+    outgoing = _window(db.session.query(
+        ProductMovement.product_key,
+        ProductMovement.from_location_key,
+        func.sum(ProductMovement.qty)
+    ).filter(ProductMovement.from_location_key.isnot(None)), after, until).group_by(
+        ProductMovement.product_key, ProductMovement.from_location_key
+    )
+    for product_key, location_key, qty in outgoing:
+        totals.setdefault((product_key, location_key), [0, 0])[1] = qty or 0
+
+    return totals
+
+# Build the balance report rows from grouped totals.
+# Returns (balance_report, any_zero_balance) with rows ordered by product, then location.
+def build_balance_report(totals=None):
+    if totals is None:
+        totals = ledger_totals()
+
+    products = Product.query.all()
+    locations = Location.query.all()
+    product_order = {product.id: (index, product) for index, product in enumerate(products)}
+    location_order = {location.id: (index, location) for index, location in enumerate(locations)}
+
+    balance_report = []
+    any_zero_balance = False
+
+    # Only pairs present in the ledger can have a row; skip keys that no longer exist
+    keys = [key for key in totals if key[0] in product_order and key[1] in location_order]
+    keys.sort(key=lambda key: (product_order[key[0]][0], location_order[key[1]][0]))
+
+    for product_key, location_key in keys:
+        incoming, outgoing = totals[(product_key, location_key)]
+
+        # Calculate balance and clamp negatives to zero
+        raw_balance = incoming - outgoing
+        clamped_balance = max(0, raw_balance)
+
+        # Track if there are zero-balance entries
+        if clamped_balance == 0 and (incoming != 0 or outgoing != 0):
+            any_zero_balance = True
+
+        # Include rows where there has been any movement (incoming or outgoing)
+        # or where positive balance exists
+        if (incoming != 0 or outgoing != 0) or clamped_balance > 0:
+            balance_report.append({
+                'product': product_order[product_key][1],
+                'location': location_order[location_key][1],
+                'quantity': clamped_balance
+            })
+
+    return balance_report, any_zero_balance
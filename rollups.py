@@ -0,0 +1,108 @@
+from sqlalchemy import delete, event, func, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, DailyMovementRollup, ProductMovement
+
+# Rows written per statement when rebuilding from the ledger
+REBUILD_BATCH_SIZE = 5000
+
+# Queue one movement's contribution to the daily rollups, by surrogate keys (sign=-1
+# takes it back out, e.g. before an edit or on delete). Applied when the current
+# transaction commits.
+def record_movement(product_key, from_location_key, to_location_key, timestamp, qty, sign=1):
+    pending = db.session.info.setdefault('rollup_deltas', {})
+    day = timestamp.date()
+    for location_key, qty_in, qty_out in ((to_location_key, qty, 0), (from_location_key, 0, qty)):
+        if not location_key:
+            continue
+        totals = pending.setdefault((product_key, location_key, day), [0, 0, 0])
+        totals[0] += sign * qty_in
+        totals[1] += sign * qty_out
+        totals[2] += sign
+
+# record_movement for row dicts of a bulk insert (importer chunks, transfer lines)
+def record_movements(rows):
+    for row in rows:
+        record_movement(row['product_key'], row['from_location_key'], row['to_location_key'], row['timestamp'], row['qty'])
+
+# Add rows of {product_key, location_key, day, qty_in, qty_out, movement_count} to the
+# rollups: one INSERT ... ON CONFLICT DO UPDATE executemany on SQLite and PostgreSQL
+def _add_to_rollups(rows):
+    if not rows:
+        return
+    dialects = {'sqlite': sqlite, 'postgresql': postgresql}
+    dialect = dialects.get(db.session.get_bind().dialect.name)
+    if dialect is None:
+        # Other databases: update existing rows one by one, insert the rest
+        for row in rows:
+            if not db.session.execute(_increment(row)).rowcount:
+                db.session.add(DailyMovementRollup(**row))
+        db.session.flush()
+        return
+
+    statement = dialect.insert(DailyMovementRollup)
+    table = DailyMovementRollup.__table__
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['product_key', 'location_key', 'day'],
+        set_={
+            'qty_in': table.c.qty_in + statement.excluded.qty_in,
+            'qty_out': table.c.qty_out + statement.excluded.qty_out,
+            'movement_count': table.c.movement_count + statement.excluded.movement_count,
+        },
+    ), rows)
+
+def _increment(row):
+    return update(DailyMovementRollup).where(
+        DailyMovementRollup.product_key == row['product_key'],
+        DailyMovementRollup.location_key == row['location_key'],
+        DailyMovementRollup.day == row['day'],
+    ).values(
+        qty_in=DailyMovementRollup.qty_in + row['qty_in'],
+        qty_out=DailyMovementRollup.qty_out + row['qty_out'],
+        movement_count=DailyMovementRollup.movement_count + row['movement_count'],
+    )
+
+# Recompute every rollup from the movement ledger: one grouped pass per direction,
+# streamed into the table in batches. Runs in the caller's transaction.
+def rebuild_rollups():
+    db.session.execute(delete(DailyMovementRollup))
+    day = func.date(ProductMovement.timestamp, type_=db.Date)
+    count = 0
+    for location_column, direction in ((ProductMovement.to_location_key, 'qty_in'),
+                                       (ProductMovement.from_location_key, 'qty_out')):
+        groups = db.session.query(
+            ProductMovement.product_key, location_column, day, func.sum(ProductMovement.qty), func.count()
+        ).filter(location_column.isnot(None)).group_by(
+            ProductMovement.product_key, location_column, day
+        ).execution_options(yield_per=REBUILD_BATCH_SIZE)
+
+        batch = []
+        for product_key, location_key, group_day, qty, movements in groups:
+            row = {'product_key': product_key, 'location_key': location_key, 'day': group_day,
+                   'qty_in': 0, 'qty_out': 0, 'movement_count': movements}
+            row[direction] = qty
+            batch.append(row)
+            if len(batch) == REBUILD_BATCH_SIZE:
+                _add_to_rollups(batch)
+                count += len(batch)
+                batch = []
+        _add_to_rollups(batch)
+        count += len(batch)
+    return count
+
+# Fold the transaction's queued movements into the rollups inside the same commit
+@event.listens_for(db.session, 'before_commit')
+def apply_rollup_deltas(session):
+    pending = session.info.pop('rollup_deltas', None)
+    if pending:
+        _add_to_rollups([
+            {'product_key': product_key, 'location_key': location_key, 'day': day,
+             'qty_in': qty_in, 'qty_out': qty_out, 'movement_count': movements}
+            for (product_key, location_key, day), (qty_in, qty_out, movements) in sorted(pending.items())
+            if qty_in or qty_out or movements
+        ])
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def forget_rollup_deltas(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('rollup_deltas', None)
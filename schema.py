@@ -0,0 +1,27 @@
+import os
+
+from flask_migrate import upgrade, stamp
+from sqlalchemy import inspect, text
+
+from models import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+# The schema as shipped before migrations existed
+BASELINE_REVISION = '0001'
+
+# Databases created by db.create_all() have tables but no alembic_version.
+# Bring them to the baseline shape and stamp them so Alembic takes over.
+def _adopt_legacy_database():
+    columns = {column['name'] for column in inspect(db.engine).get_columns('product')}
+    if 'product_name' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(text('ALTER TABLE product ADD COLUMN product_name VARCHAR(100)'))
+    stamp(directory=MIGRATIONS_DIR, revision=BASELINE_REVISION)
+
+# Bring the database schema up to date by running pending Alembic migrations.
+# Safe to run repeatedly; equivalent to `flask db upgrade` for new databases.
+def upgrade_schema():
+    tables = set(inspect(db.engine).get_table_names())
+    if 'alembic_version' not in tables and 'product' in tables:
+        _adopt_legacy_database()
+    upgrade(directory=MIGRATIONS_DIR)
@@ -0,0 +1,117 @@
+import re
+import threading
+
+from sqlalchemy import inspect, text
+
+from models import db, Product
+from versioning import current_catalog_version
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# FTS5 trigram matching needs at least three characters per term
+TRIGRAM_MIN_LENGTH = 3
+
+_backend = None
+_fallback_lock = threading.Lock()
+_fallback_index = {'version': None, 'rows': []}
+
+# Pick the search backend once per process: the FTS5 table on SQLite, pg_trgm
+# on PostgreSQL, or an in-memory Python index when neither is installed
+def get_backend():
+    global _backend
+    if _backend is None:
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite' and inspect(db.engine).has_table('product_search'):
+            _backend = 'fts5'
+        elif dialect == 'postgresql' and db.session.execute(
+                text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first():
+            _backend = 'trigram'
+        else:
+            _backend = 'python'
+    return _backend
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _rows(result):
+    return [{'product_id': product_id, 'product_name': product_name or None} for product_id, product_name in result]
+
+def _search_fts5(query, limit):
+    terms = [term for term in re.split(r'\s+', query) if term]
+    if all(len(term) >= TRIGRAM_MIN_LENGTH for term in terms):
+        # Every term must occur as a substring of the id or name; best bm25 first,
+        # with ids that start with the query ahead of the rest
+        match = ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        return _rows(db.session.execute(text(
+            "SELECT product_id, product_name FROM product_search WHERE product_search MATCH :match "
+            "ORDER BY (product_id LIKE :prefix ESCAPE '\\') DESC, bm25(product_search), product_id LIMIT :limit"
+        ), {'match': match, 'prefix': _escape_like(query) + '%', 'limit': limit}))
+
+    # Too short for trigrams: prefix match on id or name
+    prefix = _escape_like(query) + '%'
+    return _rows(db.session.execute(text(
+        "SELECT product_id, product_name FROM product_search "
+        "WHERE product_id LIKE :prefix ESCAPE '\\' OR product_name LIKE :prefix ESCAPE '\\' "
+        "ORDER BY (product_id LIKE :prefix ESCAPE '\\') DESC, product_id LIMIT :limit"
+    ), {'prefix': prefix, 'limit': limit}))
+
+def _search_trigram(query, limit):
+    # ILIKE '%q%' is served by the gin_trgm_ops indexes; similarity() ranks the hits
+    return _rows(db.session.execute(text(
+        "SELECT product_id, product_name FROM product "
+        "WHERE product_id ILIKE :pattern OR product_name ILIKE :pattern "
+        "ORDER BY (product_id ILIKE :prefix) DESC, "
+        "GREATEST(similarity(product_id, :query), similarity(COALESCE(product_name, ''), :query)) DESC, "
+        "product_id LIMIT :limit"
+    ), {'pattern': '%' + _escape_like(query) + '%', 'prefix': _escape_like(query) + '%',
+        'query': query, 'limit': limit}))
+
+# In-memory index rebuilt only when the catalog version moves (products added,
+# renamed or deleted), so stock movements never invalidate it. Built outside the
+# lock, which only guards swapping in the new rows.
+def _search_python(query, limit):
+    version = current_catalog_version()
+    with _fallback_lock:
+        rows = _fallback_index['rows'] if _fallback_index['version'] == version else None
+    if rows is None:
+        rows = [
+            (product_id, product_name or '', product_id.lower(), (product_name or '').lower())
+            for product_id, product_name in db.session.query(Product.product_id, Product.product_name)
+        ]
+        with _fallback_lock:
+            if _fallback_index['version'] is None or _fallback_index['version'] <= version:
+                _fallback_index['rows'] = rows
+                _fallback_index['version'] = version
+
+    needle = query.lower()
+    ranked = []
+    for product_id, product_name, id_key, name_key in rows:
+        if id_key == needle:
+            rank = 0
+        elif id_key.startswith(needle):
+            rank = 1
+        elif name_key.startswith(needle) or (' ' + needle) in name_key:
+            rank = 2
+        elif needle in id_key or needle in name_key:
+            rank = 3
+        else:
+            continue
+        ranked.append((rank, product_id, product_name))
+    ranked.sort()
+    return [{'product_id': product_id, 'product_name': product_name or None}
+            for _, product_id, product_name in ranked[:limit]]
+
+# Ranked product search over product_id and product_name.
+# Returns at most `limit` dicts with product_id and product_name.
+def search_products(query, limit=DEFAULT_LIMIT):
+    query = (query or '').strip()
+    if not query:
+        return []
+    limit = max(1, min(MAX_LIMIT, limit))
+
+    backend = get_backend()
+    if backend == 'fts5':
+        return _search_fts5(query, limit)
+    if backend == 'trigram':
+        return _search_trigram(query, limit)
+    return _search_python(query, limit)
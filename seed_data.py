@@ -1,11 +1,21 @@
 from app import app, db
-from models import Product, Location, ProductMovement
+from models import (Product, Location, ProductMovement, StockBalance, StockCheckpoint, StockAlert, ReorderThreshold,
+                    DailyMovementRollup, TransferDocument)
+from stock import rebuild_stock_balances
+from rollups import rebuild_rollups
+from versioning import bump_data_version
 from datetime import datetime, timedelta
 import random
 
 def seed_database():
     # Clear existing data
+    db.session.query(StockCheckpoint).delete()
+    db.session.query(StockAlert).delete()
+    db.session.query(ReorderThreshold).delete()
+    db.session.query(StockBalance).delete()
+    db.session.query(DailyMovementRollup).delete()
     db.session.query(ProductMovement).delete()
+    db.session.query(TransferDocument).delete()
     db.session.query(Product).delete()
     db.session.query(Location).delete()
     db.session.commit()
@@ -30,7 +40,11 @@ def seed_database():
     ]
     
     db.session.add_all(locations)
+    bump_data_version(catalog=True)
     db.session.commit()
+    # Movements reference both by surrogate key, assigned through the relationships
+    by_location = {location.location_id: location for location in locations}
+    by_product = {product.product_id: product for product in products}
     
     # Create product movements
     movements = []
@@ -40,9 +54,9 @@ def seed_database():
         movements.append(
             ProductMovement(
                 timestamp=datetime.now() - timedelta(days=30),
-                from_location=None,
-                to_location='WAREHOUSE',
-                product_id=product.product_id,
+                source=None,
+                destination=by_location['WAREHOUSE'],
+                product=product,
                 qty=random.randint(50, 100)
             )
         )
@@ -51,9 +65,9 @@ def seed_database():
     movements.append(
         ProductMovement(
             timestamp=datetime.now() - timedelta(days=25),
-            from_location=None,
-            to_location='STORE_NORTH',
-            product_id='LAPTOP',
+            source=None,
+            destination=by_location['STORE_NORTH'],
+            product=by_product['LAPTOP'],
             qty=20
         )
     )
@@ -62,9 +76,9 @@ def seed_database():
     movements.append(
         ProductMovement(
             timestamp=datetime.now() - timedelta(days=24),
-            from_location=None,
-            to_location='STORE_NORTH',
-            product_id='SMARTPHONE',
+            source=None,
+            destination=by_location['STORE_NORTH'],
+            product=by_product['SMARTPHONE'],
             qty=30
         )
     )
@@ -73,9 +87,9 @@ def seed_database():
     movements.append(
         ProductMovement(
             timestamp=datetime.now() - timedelta(days=20),
-            from_location='STORE_NORTH',
-            to_location='STORE_SOUTH',
-            product_id='LAPTOP',
+            source=by_location['STORE_NORTH'],
+            destination=by_location['STORE_SOUTH'],
+            product=by_product['LAPTOP'],
             qty=5
         )
     )
@@ -86,9 +100,9 @@ def seed_database():
             movements.append(
                 ProductMovement(
                     timestamp=datetime.now() - timedelta(days=random.randint(15, 20)),
-                    from_location='WAREHOUSE',
-                    to_location=location_id,
-                    product_id=product.product_id,
+                    source=by_location['WAREHOUSE'],
+                    destination=by_location[location_id],
+                    product=product,
                     qty=random.randint(5, 15)
                 )
             )
@@ -98,9 +112,9 @@ def seed_database():
         movements.append(
             ProductMovement(
                 timestamp=datetime.now() - timedelta(days=random.randint(5, 10)),
-                from_location=random.choice(['STORE_NORTH', 'STORE_SOUTH']),
-                to_location='WAREHOUSE',
-                product_id=product.product_id,
+                source=by_location[random.choice(['STORE_NORTH', 'STORE_SOUTH'])],
+                destination=by_location['WAREHOUSE'],
+                product=product,
                 qty=random.randint(1, 3)
             )
         )
@@ -111,16 +125,21 @@ def seed_database():
         movements.append(
             ProductMovement(
                 timestamp=datetime.now() - timedelta(days=random.randint(1, 5)),
-                from_location=random.choice(['WAREHOUSE', 'DISTRIBUTION']),
-                to_location=None,
-                product_id=product.product_id,
+                source=by_location[random.choice(['WAREHOUSE', 'DISTRIBUTION'])],
+                destination=None,
+                product=product,
                 qty=random.randint(1, 10)
             )
         )
     
     db.session.add_all(movements)
+    db.session.flush()
+    rebuild_rollups()
     db.session.commit()
     
+    # Materialize per-location balances from the seeded ledger
+    rebuild_stock_balances()
+    
     print(f"Database seeded with {len(products)} products, {len(locations)} locations, and {len(movements)} movements.")
 
 if __name__ == '__main__':
@@ -57,6 +57,82 @@ document.addEventListener('DOMContentLoaded', function() {
         contentWrapper.classList.add('fade-in');
     }
     
+    // Typeahead suggestions for the top search box
+    const searchInput = document.querySelector('.search-input[data-suggest-url]');
+    const suggestions = document.getElementById('search-suggestions');
+    
+    if (searchInput && suggestions) {
+        let suggestTimer = null;
+        let suggestController = null;
+        
+        searchInput.addEventListener('input', function() {
+            clearTimeout(suggestTimer);
+            const query = searchInput.value.trim();
+            if (!query) {
+                suggestions.innerHTML = '';
+                return;
+            }
+            suggestTimer = setTimeout(() => {
+                // Only the latest keystroke's request matters
+                if (suggestController) {
+                    suggestController.abort();
+                }
+                suggestController = new AbortController();
+                const url = searchInput.dataset.suggestUrl + '?q=' + encodeURIComponent(query);
+                fetch(url, { signal: suggestController.signal })
+                    .then(response => response.json())
+                    .then(products => {
+                        suggestions.innerHTML = '';
+                        products.forEach(product => {
+                            const option = document.createElement('option');
+                            option.value = product.product_id;
+                            if (product.product_name) {
+                                option.label = product.product_name;
+                            }
+                            suggestions.appendChild(option);
+                        });
+                    })
+                    .catch(() => {});
+            }, 150);
+        });
+    }
+    
+    // Product/location lookup fields on large catalogs: suggest matches as the user types.
+    // Delegated so lookup fields added later (e.g. transfer lines) work too.
+    const lookupState = new WeakMap();
+    document.addEventListener('input', function(e) {
+        const input = e.target;
+        if (!input.matches || !input.matches('input[data-lookup-url]')) {
+            return;
+        }
+        const options = document.getElementById(input.getAttribute('list'));
+        const state = lookupState.get(input) || {};
+        lookupState.set(input, state);
+
+        clearTimeout(state.timer);
+        state.timer = setTimeout(() => {
+            if (state.controller) {
+                state.controller.abort();
+            }
+            state.controller = new AbortController();
+            const url = input.dataset.lookupUrl + '?q=' + encodeURIComponent(input.value.trim());
+            fetch(url, { signal: state.controller.signal })
+                .then(response => response.json())
+                .then(page => {
+                    options.innerHTML = '';
+                    page.items.forEach(item => {
+                        const option = document.createElement('option');
+                        option.value = item.id;
+                        if (item.label !== item.id) {
+                            option.label = item.label;
+                        }
+                        options.appendChild(option);
+                    });
+                })
+                .catch(() => {});
+        }, 150);
+    });
+    
     // Add active class to current page in sidebar
     const currentPath = window.location.pathname;
     const sidebarLinks = document.querySelectorAll('.sidebar-link');
@@ -0,0 +1,174 @@
+from sqlalchemy import update, delete, insert, event, case, or_
+from sqlalchemy.exc import IntegrityError
+
+from models import db, StockBalance
+from reporting import ledger_totals
+from alerts import rebuild_alerts
+from versioning import bump_data_version
+from rollups import record_movement
+from reference_data import reference_data
+
+# Current on-hand quantity of a product at a location, by surrogate keys (primary key lookup)
+def get_on_hand(product_key, location_key):
+    balance = db.session.get(StockBalance, (product_key, location_key))
+    return balance.on_hand if balance else 0
+
+# Check a proposed movement, given by surrogate keys, against the same rules as the
+# movement forms. `original` is the movement being edited, whose own outgoing qty is
+# available again. Returns an error message, or None when the movement is valid.
+def validate_movement(product_key, from_location_key, to_location_key, qty, original=None):
+    if qty <= 0:
+        return 'Quantity must be a positive number!'
+
+    # Validate that at least one location is specified
+    if not from_location_key and not to_location_key:
+        return 'Either source or destination location must be specified!'
+
+    # Prevent negative stock: when moving OUT from a location, ensure sufficient stock
+    if from_location_key:
+        available = get_on_hand(product_key, from_location_key)
+
+        # If the original movement was also outgoing from the same source, add its qty back
+        if original is not None and original.from_location_key == from_location_key and original.product_key == product_key:
+            available += original.qty
+
+        # If no stock available at source, block any outward/transfer movement
+        if available <= 0:
+            return 'No stock available at the source location for this product.'
+        if qty > available:
+            return f'Insufficient stock at source location. Available: {available}'
+
+    return None
+
+# Raised when a conditional decrement finds less stock than requested,
+# typically because a concurrent movement consumed it after validation
+class InsufficientStock(Exception):
+    def __init__(self, product_key, location_key, qty):
+        product_id = reference_data.id_of('products', product_key)
+        location_id = reference_data.id_of('locations', location_key)
+        super().__init__(f'Insufficient stock at source location: {qty} x {product_id} is no longer available at {location_id}.')
+        self.product_key = product_key
+        self.location_key = location_key
+        self.qty = qty
+
+def _balance_update(product_key, location_key, delta):
+    return (
+        update(StockBalance)
+        .where(StockBalance.product_key == product_key, StockBalance.location_key == location_key)
+        .values(on_hand=StockBalance.on_hand + delta, version=StockBalance.version + 1)
+    )
+
+# Add delta to the balance row for (product, location), creating it on first use.
+# Runs in the caller's transaction so the balance commits together with the movement.
+# With reserve=True a decrement only applies while on_hand covers it: the UPDATE's
+# row lock serializes concurrent writers and its WHERE clause is evaluated against
+# the latest committed balance, so two workers can never both take the last units.
+def adjust_balance(product_key, location_key, delta, reserve=False):
+    if not location_key or delta == 0:
+        return
+
+    statement = _balance_update(product_key, location_key, delta)
+    conditional = reserve and delta < 0
+    if conditional:
+        statement = statement.where(StockBalance.on_hand >= -delta)
+
+    result = db.session.execute(statement)
+    if not result.rowcount:
+        if conditional:
+            raise InsufficientStock(product_key, location_key, -delta)
+
+        # First movement for this pair. A concurrent writer may insert the row first,
+        # in which case the savepoint rolls back and the update is applied to its row.
+        try:
+            with db.session.begin_nested():
+                db.session.add(StockBalance(product_key=product_key, location_key=location_key, on_hand=delta, version=1))
+        except IntegrityError:
+            db.session.execute(_balance_update(product_key, location_key, delta))
+
+    _record_delta(product_key, location_key, delta)
+
+# Commit hooks (alerts, live events) act on the balances a transaction touched
+def _record_delta(product_key, location_key, delta):
+    deltas = db.session.info.setdefault('balance_deltas', {})
+    deltas[(product_key, location_key)] = deltas.get((product_key, location_key), 0) + delta
+
+# Batch form of adjust_balance for many products at one location, {product_key: delta}:
+# one UPDATE for the existing rows and one INSERT for pairs seen for the first time.
+# With reserve=True every decrement is conditional as in adjust_balance, and the
+# batch raises InsufficientStock unless all of them apply.
+def adjust_balances(location_key, deltas, reserve=False):
+    deltas = {product_key: delta for product_key, delta in deltas.items() if delta}
+    if not location_key or not deltas:
+        return
+
+    change = case(deltas, value=StockBalance.product_key, else_=0)
+    statement = (
+        update(StockBalance)
+        .where(StockBalance.location_key == location_key, StockBalance.product_key.in_(sorted(deltas)))
+        .values(on_hand=StockBalance.on_hand + change, version=StockBalance.version + 1)
+        .returning(StockBalance.product_key)
+    )
+    if reserve:
+        statement = statement.where(or_(change > 0, StockBalance.on_hand + change >= 0))
+    updated = set(db.session.scalars(statement))
+
+    missing = sorted(product_key for product_key in deltas if product_key not in updated)
+    if reserve:
+        for product_key in missing:
+            if deltas[product_key] < 0:
+                raise InsufficientStock(product_key, location_key, -deltas[product_key])
+    if missing:
+        # As in adjust_balance, a concurrent writer may create some of these rows first
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(StockBalance), [
+                    {'product_key': product_key, 'location_key': location_key, 'on_hand': deltas[product_key], 'version': 1}
+                    for product_key in missing
+                ])
+        except IntegrityError:
+            for product_key in missing:
+                adjust_balance(product_key, location_key, deltas[product_key])
+            missing = []
+
+    for product_key in updated.union(missing):
+        _record_delta(product_key, location_key, deltas[product_key])
+
+# Book a movement into the balances and daily rollups (sign=-1 reverses a previously
+# booked movement). With reserve=True the decrement at the source is conditional,
+# see adjust_balance.
+def apply_movement(movement, sign=1, reserve=False):
+    adjust_balance(movement.product_key, movement.from_location_key, -sign * movement.qty, reserve=reserve)
+    adjust_balance(movement.product_key, movement.to_location_key, sign * movement.qty)
+    record_movement(movement.product_key, movement.from_location_key, movement.to_location_key,
+                    movement.timestamp, movement.qty, sign)
+
+def revert_movement(movement):
+    apply_movement(movement, sign=-1)
+
+# Recompute every balance from the movement ledger in one grouped pass
+def rebuild_stock_balances():
+    totals = ledger_totals()
+
+    db.session.execute(delete(StockBalance))
+    if totals:
+        db.session.execute(insert(StockBalance), [
+            {'product_key': product_key, 'location_key': location_key, 'on_hand': incoming - outgoing, 'version': 1}
+            for (product_key, location_key), (incoming, outgoing) in totals.items()
+        ])
+    rebuild_alerts()
+    bump_data_version()
+    db.session.commit()
+    return len(totals)
+
+# Net balance changes of the current transaction, {(product_key, location_key): delta}
+def pending_balance_deltas(session):
+    return session.info.get('balance_deltas', {})
+
+@event.listens_for(db.session, 'after_commit')
+def forget_balance_deltas(session):
+    session.info.pop('balance_deltas', None)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def forget_rolled_back_deltas(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('balance_deltas', None)
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models import db, ProductMovement, StockBalance, TransferDocument
+from stock import adjust_balances
+from events import record_movement_events
+from rollups import record_movements
+from reference_data import reference_data
+
+# Most lines accepted in one transfer document
+MAX_TRANSFER_LINES = 500
+
+# Longest reference a transfer document can carry; longer ones are rejected
+MAX_REFERENCE_LENGTH = 50
+
+# Check a transfer document: its locations, every (product_id, qty) line, and the
+# stock at the source for all lines at once in one aggregated query.
+# Returns (lines, errors) with the lines cleaned up as [(product_key, qty)].
+def validate_transfer(from_location, to_location, raw_lines):
+    catalogs = reference_data.catalogs()
+    errors = []
+    if not from_location and not to_location:
+        errors.append('Either source or destination location must be specified!')
+    elif from_location == to_location:
+        errors.append('Source and destination locations must differ.')
+    for location_id in (from_location, to_location):
+        if location_id and location_id not in catalogs['locations'].id_set:
+            errors.append(f'Unknown location "{location_id}".')
+
+    if not raw_lines:
+        errors.append('A transfer needs at least one line.')
+    elif len(raw_lines) > MAX_TRANSFER_LINES:
+        errors.append(f'A transfer can have at most {MAX_TRANSFER_LINES} lines.')
+
+    lines = []
+    for number, (product_id, qty) in enumerate(raw_lines[:MAX_TRANSFER_LINES], start=1):
+        product_id = str(product_id or '').strip()
+        if not product_id:
+            errors.append(f'Line {number}: missing product.')
+            continue
+        if product_id not in catalogs['products'].id_set:
+            errors.append(f'Line {number}: unknown product "{product_id}".')
+            continue
+        try:
+            qty = int(qty)
+        except (TypeError, ValueError):
+            errors.append(f'Line {number}: invalid quantity "{qty}".')
+            continue
+        if qty <= 0:
+            errors.append(f'Line {number}: quantity must be a positive number.')
+            continue
+        lines.append((catalogs['products'].key_by_id[product_id], qty))
+
+    if from_location and not errors:
+        from_location_key = catalogs['locations'].key_by_id[from_location]
+        requested = product_totals(lines)
+        available = dict(db.session.query(StockBalance.product_key, StockBalance.on_hand).filter(
+            StockBalance.location_key == from_location_key, StockBalance.product_key.in_(list(requested))))
+        for product_key, qty in requested.items():
+            if qty > available.get(product_key, 0):
+                errors.append(f'Insufficient stock of {catalogs["products"].id_by_key[product_key]} at {from_location}: '
+                              f'{qty} requested, {max(0, available.get(product_key, 0))} available.')
+    return lines, errors
+
+# Total quantity per product; a product may appear on several lines
+def product_totals(lines):
+    totals = {}
+    for product_key, qty in lines:
+        totals[product_key] = totals.get(product_key, 0) + qty
+    return totals
+
+# Book a validated transfer in the caller's transaction: the document, all of its
+# lines in one bulk INSERT, one conditional UPDATE per location for the
+# balances and one upsert for the daily rollups. Raises InsufficientStock if a concurrent write consumed the stock
+# after validation; the caller rolls back, so no line is booked.
+def create_transfer(from_location, to_location, lines, reference=None):
+    locations = reference_data.catalog('locations').key_by_id
+    from_location_key = locations.get(from_location)
+    to_location_key = locations.get(to_location)
+    now = datetime.now()
+    document = TransferDocument(reference=(reference or '').strip() or None, from_location_key=from_location_key,
+                                to_location_key=to_location_key, created_at=now)
+    db.session.add(document)
+    db.session.flush()
+
+    rows = [
+        {'timestamp': now, 'product_key': product_key, 'from_location_key': from_location_key,
+         'to_location_key': to_location_key, 'qty': qty, 'document_id': document.id}
+        for product_key, qty in lines
+    ]
+    movements = db.session.scalars(insert(ProductMovement).returning(ProductMovement), rows).all()
+    record_movements(rows)
+
+    totals = product_totals(lines)
+    adjust_balances(from_location_key, {product_key: -qty for product_key, qty in totals.items()}, reserve=True)
+    adjust_balances(to_location_key, totals)
+
+    record_movement_events('created', movements)
+    return document
+
+def transfer_to_dict(document):
+    products = reference_data.catalog('products').id_by_key
+    return {
+        'id': document.id,
+        'reference': document.reference,
+        'from_location': document.source.location_id if document.source else None,
+        'to_location': document.destination.location_id if document.destination else None,
+        'created_at': document.created_at.isoformat(),
+        'lines': [
+            {'movement_id': line.movement_id, 'product_id': products.get(line.product_key), 'qty': line.qty}
+            for line in document.lines
+        ],
+    }
@@ -0,0 +1,32 @@
+from sqlalchemy import update
+
+from models import db, DataVersion
+
+# Rows of the data_version table: the data version moves on every write, the
+# catalog version only when products or locations are added, renamed or deleted
+DATA_VERSION_ID = 1
+CATALOG_VERSION_ID = 2
+
+def _bump(row_id):
+    result = db.session.execute(
+        update(DataVersion).where(DataVersion.id == row_id).values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(DataVersion(id=row_id, version=1))
+        db.session.flush()
+
+def _current(row_id):
+    return db.session.query(DataVersion.version).filter(DataVersion.id == row_id).scalar() or 0
+
+# Increment the data version inside the caller's transaction; pass catalog=True
+# when the write changes the product or location catalog
+def bump_data_version(catalog=False):
+    _bump(DATA_VERSION_ID)
+    if catalog:
+        _bump(CATALOG_VERSION_ID)
+
+def current_data_version():
+    return _current(DATA_VERSION_ID)
+
+def current_catalog_version():
+    return _current(CATALOG_VERSION_ID)